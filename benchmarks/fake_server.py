@@ -0,0 +1,157 @@
+"""Local stand-in for ReadComicsOnline.ru used by the benchmarks.
+
+Serves synthetic search results, comic pages, chapter reader pages and
+JPEG pages with a configurable latency and bandwidth per response.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import io
+import json
+import re
+import threading
+import time
+
+from PIL import Image
+
+CHAPTER_PAGE_RE = re.compile(r"^/comic/([^/]+)/([^/]+)$")
+COMIC_RE = re.compile(r"^/comic/([^/]+)$")
+IMAGE_RE = re.compile(r"^/uploads/manga/([^/]+)/chapters/([^/]+)/(\d+)\.jpg$")
+
+
+def make_jpeg(width: int, height: int, seed: int = 0) -> bytes:
+    """Noisy JPEG so its size is close to a real scanned page of the same dimensions."""
+
+    image = Image.effect_noise((width, height), 64 + seed % 32).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def comic_html(base_url: str, slug: str, chapters: int) -> str:
+    items = "".join(
+        f'<li class="volume-0"><h5 class="chapter-title-rtl"><a href="{base_url}/comic/{slug}/{c}">{slug} #{c}</a></h5>'
+        f'<div class="date-chapter-title-rtl">01 Jan. 2020</div></li>'
+        for c in range(chapters, 0, -1))
+
+    return (f'<html><head><title>{slug}</title></head><body><nav>{"<a href=#>link</a>" * 200}</nav>'
+            f'<div class="col-sm-12"><div class="list-container"><h2 class="listmanga-header">{slug.title()}</h2>'
+            f'<img class="img-responsive" src="//readcomicsonline.ru/uploads/manga/{slug}/cover.jpg"/></div>'
+            f'<dl class="dl-horizontal"><dt>Type</dt><dd>Comic</dd><dt>Status</dt><dd>Ongoing</dd>'
+            f'<dt>Other names</dt><dd>{slug} other</dd><dt>Author(s)</dt><dd><a>Writer</a>, <a>Artist</a></dd>'
+            f'<dt>Date of release</dt><dd>2020</dd><dt>Categories</dt><dd><a>Marvel</a></dd>'
+            f'<dt>Tags</dt><dd><a>Action</a><a>Adventure</a></dd><dt>Views</dt><dd>1234</dd>'
+            f'<dt>Rating</dt><dd><div id="item-rating" data-score="4.5"></div></dd></dl>'
+            f'<div class="manga well"><p>Summary of {slug}.</p></div><ul class="chapters">{items}</ul></div>'
+            f'<footer>{"<p>footer</p>" * 100}</footer></body></html>')
+
+
+def chapter_html(pages: int) -> str:
+    options = "".join(
+        f'<option value="{i}">Page {i}</option>' for i in range(1, pages + 1))
+    return (f'<html><body><nav>{"<a href=#>link</a>" * 200}</nav><select class="selectpicker" id="page-list">{options}</select>'
+            f'<div id="all">{"<img/>" * pages}</div></body></html>')
+
+
+class FakeComicServer:
+    def __init__(self, chapters: int = 10, pages: int = 20, image_size=(800, 1200), latency: float = 0.0,
+                 bandwidth: int = None):
+        """Threaded HTTP server mimicking the site, started on a free local port.
+
+        Keyword Arguments:
+            chapters {int} -- Chapters of every comic (default: {10})
+            pages {int} -- Pages of every chapter (default: {20})
+            image_size {tuple} -- Width and height of the JPEG pages (default: {(800, 1200)})
+            latency {float} -- Seconds added before every response (default: {0.0})
+            bandwidth {int} -- Bytes per second of every response, None for unlimited (default: {None})
+        """
+
+        self.chapters = chapters
+        self.pages = pages
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.images = [make_jpeg(*image_size, seed=i) for i in range(4)]
+
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                url = urlparse(self.path)
+
+                if url.path == "/search":
+                    query = parse_qs(url.query).get("query", [""])[0]
+                    suggestions = [{"value": f"{query.title()} {i}", "data": f"{query.lower()}-{i}"}
+                                   for i in range(10)]
+                    return self._send(json.dumps({"suggestions": suggestions}).encode(), "application/json")
+
+                match = IMAGE_RE.match(url.path)
+                if match:
+                    page = int(match.group(3))
+                    if page < 1 or page > server.pages:
+                        return self._send(b"Not Found", "text/plain", 404)
+                    return self._send(server.images[page % len(server.images)], "image/jpeg")
+
+                if CHAPTER_PAGE_RE.match(url.path):
+                    return self._send(chapter_html(server.pages).encode())
+
+                match = COMIC_RE.match(url.path)
+                if match:
+                    return self._send(comic_html(server.base_url, match.group(1), server.chapters).encode())
+
+                self._send(b"Not Found", "text/plain", 404)
+
+            def _send(self, body: bytes, content_type: str = "text/html", status: int = 200):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+                if self.command == "HEAD":
+                    return
+
+                if server.bandwidth is None:
+                    self.wfile.write(body)
+                    return
+
+                # 20 writes per second at the configured rate.
+                chunk_size = max(server.bandwidth // 20, 1)
+                for i in range(0, len(body), chunk_size):
+                    self.wfile.write(body[i:i + chunk_size])
+                    time.sleep(len(body[i:i + chunk_size]) / server.bandwidth)
+
+        return Handler
@@ -0,0 +1,321 @@
+"""Benchmarks of Comickaze against a local fake site.
+
+    python benchmarks/run.py --threads 1,4,8 --output results.json
+
+Every result is one JSON object with the benchmark name, its parameters
+and timings, so runs can be diffed to track regressions.
+"""
+
+from os import path
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import img2pdf
+
+from comickaze import Comickaze, Converter
+from comickaze.Metrics import Metrics
+from comickaze.Transform import Transform, WEBP
+from comickaze.util import create_folders
+
+from fake_server import FakeComicServer, comic_html
+
+
+def timed(function, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started_at)
+
+    return {"min": min(timings), "median": statistics.median(timings), "runs": timings}
+
+
+def client(server: FakeComicServer, **kwargs) -> Comickaze:
+    class LocalComickaze(Comickaze):
+        BASE_URL = server.base_url
+
+    return LocalComickaze(**kwargs)
+
+
+def bench_fetch(server, args, results):
+    ck = client(server)
+    comic = ck.get_comic(f"{server.base_url}/comic/bench")
+    chapter = comic.chapters[0]
+
+    for name, function in [("search_comics", lambda: ck.search_comics("bench")),
+                           ("get_comic", lambda: ck.get_comic(
+                               f"{server.base_url}/comic/bench")),
+                           ("get_chapter_pages", lambda: ck.get_chapter_pages(chapter))]:
+        results.append(dict(name=name, params={"chapters": server.chapters, "pages": server.pages},
+                            **timed(function, args.repeat)))
+
+
+def bench_parse(args, results):
+    markup = comic_html("https://readcomicsonline.ru",
+                        "bench", args.parse_chapters)
+
+    for parser in ["html.parser", "lxml"]:
+        class OfflineComickaze(Comickaze):
+            def _get_text(self, url, kind, **kwargs):
+                return markup
+
+        try:
+            ck = OfflineComickaze(parser=parser)
+            ck.get_comic("https://readcomicsonline.ru/comic/bench")
+        except Exception as e:
+            results.append({"name": "parse_comic", "params": {
+                           "parser": parser}, "error": str(e)})
+            continue
+
+        results.append(dict(name="parse_comic", params={"parser": parser, "chapters": args.parse_chapters, "bytes": len(markup)},
+                            **timed(lambda: ck.get_comic("https://readcomicsonline.ru/comic/bench"), args.repeat)))
+
+
+def bench_download(server, args, results):
+    for engine in args.engines:
+        for threads in args.threads:
+            def download():
+                download_dir = tempfile.mkdtemp()
+                try:
+                    ck = client(server)
+                    comic = ck.get_comic(f"{server.base_url}/comic/bench")
+                    metrics = Metrics()
+                    ck.create_downloader(comic.chapters, number_of_threads=threads, output_format=Converter.IMG,
+                                         engine=engine, metrics=metrics).start(download_dir)
+                    download.report = metrics.report()
+                finally:
+                    shutil.rmtree(download_dir, ignore_errors=True)
+
+            try:
+                timing = timed(download, args.repeat)
+            except ImportError as e:
+                results.append({"name": "download", "params": {
+                               "engine": engine}, "error": str(e)})
+                break
+
+            report = download.report
+            results.append(dict(name="download", params={"engine": engine, "threads": threads, "chapters": server.chapters,
+                                                         "pages": server.pages, "latency": server.latency,
+                                                         "bandwidth": server.bandwidth},
+                                pages_per_second=report["pages_per_second"], bytes_per_second=report["bytes_per_second"],
+                                latency_p50=report["latency"]["p50"], latency_p95=report["latency"]["p95"],
+                                **timing))
+
+
+def stage_comic(server, root: str, chapters: int, pages: int) -> str:
+    comic_dir = path.join(root, "Bench")
+
+    for c in range(chapters):
+        chapter_dir = path.join(comic_dir, f"Bench #{c + 1}")
+        create_folders(chapter_dir)
+
+        for p in range(pages):
+            with open(path.join(chapter_dir, f"{p + 1:02d}.jpg"), "wb") as f:
+                f.write(server.images[p % len(server.images)])
+
+    return comic_dir
+
+
+def dir_size(directory: str) -> int:
+    return sum(path.getsize(path.join(root, f)) for root, _, files in os.walk(directory) for f in files)
+
+
+def bench_convert(server, args, results):
+    for name, convert in [("to_CBZ", lambda comic_dir: Converter.to_CBZ(comic_dir)),
+                          ("to_PDF", lambda comic_dir: Converter.to_PDF(comic_dir)),
+                          ("to_merged_PDF", lambda comic_dir: Converter.to_merged_PDF(comic_dir))]:
+        timings = []
+        for _ in range(args.repeat):
+            root = tempfile.mkdtemp()
+            try:
+                comic_dir = stage_comic(
+                    server, root, server.chapters, server.pages)
+                staged = dir_size(root)
+
+                started_at = time.perf_counter()
+                convert(comic_dir)
+                timings.append(time.perf_counter() - started_at)
+
+                output = dir_size(root)
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+
+        results.append({"name": name, "params": {"chapters": server.chapters, "pages": server.pages},
+                        "min": min(timings), "median": statistics.median(timings), "runs": timings,
+                        "staged_bytes": staged, "output_bytes": output})
+
+
+def bench_pdf_memory(server, args, results):
+    for pages in args.pdf_pages:
+        root = tempfile.mkdtemp()
+        try:
+            chapter_dir = path.join(stage_comic(
+                server, root, 1, pages), "Bench #1")
+            images = Converter.get_images(chapter_dir)
+
+            for writer, convert in [("PDFWriter", lambda: Converter.chapter_to_PDF(chapter_dir, root, delete=False)),
+                                    ("img2pdf", lambda: img2pdf.convert(images))]:
+                tracemalloc.start()
+                started_at = time.perf_counter()
+                convert()
+                seconds = time.perf_counter() - started_at
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                results.append({"name": "pdf_memory", "params": {"writer": writer, "pages": pages},
+                                "seconds": seconds, "peak_bytes": peak})
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_transform(server, args, results):
+    for params in [{"max_size": 1000}, {"quality": 60}, {"image_format": WEBP}, {"grayscale": True}]:
+        root = tempfile.mkdtemp()
+        try:
+            comic_dir = stage_comic(
+                server, root, server.chapters, server.pages)
+            chapter_dirs = Converter.get_chapter_dirs(comic_dir)
+
+            stats = Converter.transform_dirs(
+                Transform(**params), chapter_dirs, args.processes)
+        except ImportError as e:
+            results.append({"name": "transform", "params": params, "error": str(e)})
+            break
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+        results.append(dict(name="transform", params=dict(params, processes=args.processes, chapters=server.chapters,
+                                                          pages=server.pages), **stats))
+
+
+def sized_image(size: int) -> bytes:
+    """JPEG shaped body of exactly size bytes, enough for the page checks."""
+
+    return b"\xff\xd8" + os.urandom(size - 4) + b"\xff\xd9"
+
+
+def bench_write(server, args, results):
+    images = server.images
+
+    try:
+        for page_size in args.page_sizes:
+            server.images = [sized_image(page_size * 1024)]
+
+            for mode, kwargs in [("disk", {"output_format": Converter.IMG}),
+                                 ("in_memory", {"output_format": Converter.CBZ, "in_memory": True}),
+                                 ("streaming", {"output_format": Converter.CBZ, "streaming": True})]:
+                def download():
+                    download_dir = tempfile.mkdtemp()
+                    try:
+                        ck = client(server)
+                        comic = ck.get_comic(f"{server.base_url}/comic/bench")
+                        metrics = Metrics()
+                        ck.create_downloader(comic.chapters, number_of_threads=args.threads[-1], metrics=metrics,
+                                             **kwargs).start(download_dir)
+                        download.report = metrics.report()
+                    finally:
+                        shutil.rmtree(download_dir, ignore_errors=True)
+
+                timing = timed(download, args.repeat)
+                report = download.report
+                results.append(dict(name="write", params={"mode": mode, "page_kib": page_size, "threads": args.threads[-1],
+                                                          "chapters": server.chapters, "pages": server.pages},
+                                    pages_per_second=report["pages_per_second"],
+                                    bytes_per_second=report["bytes_per_second"], **timing))
+    finally:
+        server.images = images
+
+
+BENCHMARKS = ["fetch", "parse", "download", "convert", "pdf_memory", "transform", "write"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help=f"Comma separated benchmarks to run: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--threads", default="1,4,8",
+                        help="Comma separated thread counts")
+    parser.add_argument("--engines", default="thread,async",
+                        help="Comma separated download engines")
+    parser.add_argument("--chapters", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--image-size", default="800x1200",
+                        help="Width x height of the pages")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Seconds added to every response")
+    parser.add_argument("--bandwidth", type=int, default=None,
+                        help="Bytes per second of every response")
+    parser.add_argument("--parse-chapters", type=int, default=3000,
+                        help="Chapters on the page of the parse benchmark")
+    parser.add_argument("--pdf-pages", default="10,50,200",
+                        help="Comma separated page counts of the PDF memory benchmark")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Size of the process pool of the transform benchmark, defaults to the number of CPUs")
+    parser.add_argument("--page-sizes", default="64,512,2048",
+                        help="Comma separated page sizes in KiB of the write benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", default=None,
+                        help="JSON file of the results, stdout by default")
+    args = parser.parse_args()
+
+    args.threads = [int(t) for t in args.threads.split(",")]
+    args.engines = args.engines.split(",")
+    args.pdf_pages = [int(p) for p in args.pdf_pages.split(",")]
+    args.page_sizes = [int(p) for p in args.page_sizes.split(",")]
+    only = args.only.split(",")
+    width, height = (int(d) for d in args.image_size.split("x"))
+
+    results = []
+    with FakeComicServer(chapters=args.chapters, pages=args.pages, image_size=(width, height),
+                         latency=args.latency, bandwidth=args.bandwidth) as server:
+        for name in BENCHMARKS:
+            if name not in only:
+                continue
+
+            print(f"Running {name}...", file=sys.stderr)
+
+            if name == "fetch":
+                bench_fetch(server, args, results)
+            elif name == "parse":
+                bench_parse(args, results)
+            elif name == "download":
+                bench_download(server, args, results)
+            elif name == "convert":
+                bench_convert(server, args, results)
+            elif name == "pdf_memory":
+                bench_pdf_memory(server, args, results)
+            elif name == "transform":
+                bench_transform(server, args, results)
+            elif name == "write":
+                bench_write(server, args, results)
+
+    report = {
+        "meta": {
+            "time": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items()}
+        },
+        "results": results
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .Cache import CHAPTER
+from .objects import Chapter
+from .Pipeline import get_content_length
+from .Resolver import HTML
+
+
+class AsyncEngine:
+    def __init__(self, downloader):
+        """asyncio based download engine of a {Downloader}.
+
+        Chapter pages and images are fetched on a single event loop with
+        aiohttp, file writes are handed off to the loop's executor.
+
+        Arguments:
+            downloader {Downloader} -- Downloader that owns the chapters and the progress state
+        """
+
+        self.downloader = downloader
+        self.connections_per_host = downloader.number_of_threads
+        self.logger = downloader.logger
+
+    def run(self, **kwargs):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError(
+                "The async engine requires aiohttp. Install it with: pip install Comickaze[async]")
+
+        asyncio.run(self._run(aiohttp, **kwargs))
+
+    async def _run(self, aiohttp, **kwargs):
+        connector = aiohttp.TCPConnector(
+            limit=0, limit_per_host=self.connections_per_host)
+        discovery = asyncio.Semaphore(
+            self.downloader.number_of_discovery_threads)
+
+        # Chapters wait for the staging limits on their own thread, waiting
+        # on the loop's executor could starve the page writes that free them.
+        self._admission = ThreadPoolExecutor(max_workers=1)
+        # Finished chapters are handed to the pipeline stages, which block
+        # while they are full. A single thread keeps the reports in order.
+        self._progress = ThreadPoolExecutor(max_workers=1)
+
+        # Leaves the wait for a connector slot out of the recorded latency.
+        trace_config = self.downloader.fetcher.trace_config(aiohttp)
+
+        try:
+            async with aiohttp.ClientSession(connector=connector, trace_configs=[trace_config]) as session:
+                await asyncio.gather(*[self._download_chapter(session, discovery, chapter, **kwargs)
+                                       for chapter in self.downloader.chapters])
+        finally:
+            self._admission.shutdown()
+            self._progress.shutdown()
+
+    async def _report(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._progress, partial(func, *args, **kwargs))
+
+    async def _download_chapter(self, session, discovery: asyncio.Semaphore, chapter: Chapter, **kwargs):
+        if self.downloader._is_chapter_complete(chapter):
+            self.logger.debug("Skipping %s, already downloaded.", chapter.title)
+            await self._report(self.downloader._register_chapter, chapter, [], **kwargs)
+            return
+
+        try:
+            async with discovery:
+                pages = await self._get_pages(session, chapter)
+        except Exception:
+            self.logger.exception(
+                f"Failed to get the pages of {chapter.title}.")
+            await self._report(self.downloader._register_chapter,
+                               chapter, [], failed=True, **kwargs)
+            return
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._admission, self.downloader._admit_chapter, chapter, pages)
+
+        chapter_dir = await self._report(self.downloader._register_chapter,
+                                         chapter, pages, **kwargs)
+
+        await asyncio.gather(*[self._download_page(session, chapter, page, chapter_dir, **kwargs)
+                               for page in pages])
+
+    async def _get_pages(self, session, chapter: Chapter):
+        if chapter.resolved:
+            return chapter.pages
+
+        loop = asyncio.get_running_loop()
+
+        # Probing resolvers send their own concurrent requests.
+        if chapter.comickaze.resolver != HTML:
+            return await loop.run_in_executor(None, chapter.get_pages)
+
+        cache = chapter.comickaze.cache
+        entry = None
+
+        if cache is not None:
+            entry = await loop.run_in_executor(None, cache.lookup, chapter.link)
+
+        if entry is not None and cache.is_fresh(entry):
+            markup = entry["body"]
+        else:
+            # A stale entry is revalidated, a 304 has no body to fetch.
+            headers = cache.conditional_headers(entry) if cache is not None else {}
+            status, body, headers = await self.downloader.fetcher.aread(
+                session, chapter.link, headers=headers, check=lambda body, res: (res.status, body, res.headers))
+            markup = body.decode("utf-8", errors="replace")
+
+            if cache is not None:
+                markup = await loop.run_in_executor(None, cache.update, chapter.link, CHAPTER, entry, status,
+                                                    markup, headers)
+
+        # Parsing is CPU bound, keep it off the event loop.
+        return await loop.run_in_executor(None, chapter.comickaze.parse_chapter_pages, chapter, markup)
+
+    async def _download_page(self, session, chapter: Chapter, page: str, chapter_dir: str, **kwargs):
+        page_path = self.downloader._page_path(page, chapter_dir)
+        failed = False
+
+        if self.downloader._is_page_complete(chapter, page_path):
+            self.logger.debug("Skipping %s, already downloaded.", page)
+            self.downloader.metrics.record_page(page, 0, skipped=True)
+            await self._report(self.downloader._page_done, chapter, **kwargs)
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+
+            if await loop.run_in_executor(None, self.downloader._from_store, chapter, page, page_path):
+                await self._report(self.downloader._page_done, chapter, **kwargs)
+                return
+
+            # A body that is cut short or not an image is fetched again.
+            data, headers = await self.downloader.fetcher.aread(
+                session, page, metrics=self.downloader.metrics,
+                check=lambda body, res: self.downloader._check_body(page, body, res.headers))
+
+            await loop.run_in_executor(None, self.downloader._save_page, chapter, page, page_path, data,
+                                       headers.get("ETag"), get_content_length(headers))
+        except Exception as e:
+            self.logger.exception(f"Failed to download {page}.")
+            self.downloader.metrics.record_error(page, e)
+            failed = True
+
+        await self._report(self.downloader._page_done, chapter, failed=failed, **kwargs)
+
@@ -0,0 +1,81 @@
+from typing import List
+
+ALL = "all"
+
+
+class BatchItem:
+    def __init__(self, comic: str, chapters: str = ALL, line: str = None):
+        """Entry of a batch download.
+
+        Arguments:
+            comic {str} -- Link or slug of the comic
+
+        Keyword Arguments:
+            chapters {str} -- Chapter range in reading order, e.g. "1-10,15,20-" (default: {"all"})
+            line {str} -- Line the entry was parsed from (default: {None})
+        """
+
+        self.comic = comic
+        self.chapters = chapters
+        self.line = line if line is not None else f"{comic} {chapters}"
+
+    def __str__(self):
+        return self.line
+
+
+def parse_batch(lines) -> List[BatchItem]:
+    """Parses batch entries, one "<link or slug> [range]" per line. Blank lines and # comments are ignored.
+
+    Arguments:
+        lines {Iterable[str]} -- Lines, e.g. an open file or stdin
+
+    Returns:
+        List[BatchItem] -- Batch entries
+    """
+
+    items = []
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+
+        if not line:
+            continue
+
+        parts = line.split(None, 1)
+        items.append(BatchItem(parts[0], parts[1].replace(
+            " ", "") if len(parts) > 1 else ALL, line=line))
+
+    return items
+
+
+def parse_range(spec: str, count: int) -> List[int]:
+    """Turns a range like "1-10,15,20-" into 0-based indices, positions are 1-based.
+
+    Arguments:
+        spec {str} -- Range, "all" for everything
+        count {int} -- Number of chapters
+
+    Raises:
+        ValueError: The range is malformed
+
+    Returns:
+        List[int] -- Sorted indices within count
+    """
+
+    if spec.lower() == ALL:
+        return list(range(count))
+
+    indices = set()
+    for part in spec.split(","):
+        if "-" in part:
+            start, end = part.split("-", 1)
+            start = int(start) if start else 1
+            end = int(end) if end else count
+        else:
+            start = end = int(part)
+
+        if start < 1 or end < start:
+            raise ValueError(f"Invalid chapter range: {part}")
+
+        indices.update(range(start - 1, min(end, count)))
+
+    return sorted(indices)
@@ -0,0 +1,165 @@
+import os
+import shutil
+import sqlite3
+import threading
+from os import path
+
+from .Manifest import PART_SUFFIX
+from .util import create_folders
+
+OBJECTS_DIRNAME = "objects"
+INDEX_FILENAME = "index.sqlite3"
+
+
+class BlobStore:
+    def __init__(self, store_dir: str):
+        """Content-addressed store of page images, safe to share between threads.
+
+        Every image is kept once under objects/ab/cdef..., named after its
+        sha256, and hardlinked into the chapter directories that use it. An
+        index maps the url of every stored image to its hash, so a known url
+        is linked instead of downloaded again. Image urls are assumed to be
+        immutable.
+
+        The store must be on the same filesystem as the download directory
+        for hardlinks to work, pages are copied otherwise.
+
+        Arguments:
+            store_dir {str} -- Directory of the store
+        """
+
+        self.store_dir = store_dir
+        self.objects_dir = path.join(store_dir, OBJECTS_DIRNAME)
+
+        create_folders(self.objects_dir)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path.join(store_dir, INDEX_FILENAME), check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS urls (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            etag TEXT
+        )""")
+        self._db.commit()
+
+    def blob_path(self, sha256: str) -> str:
+        return path.join(self.objects_dir, sha256[:2], sha256[2:])
+
+    def lookup(self, url: str):
+        """Gets the stored image of a url.
+
+        Arguments:
+            url {str} -- Url of the image
+
+        Returns:
+            tuple -- (sha256, size) of the image, None if the url is unknown or its blob is gone
+        """
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sha256, size FROM urls WHERE url = ?", (url,)).fetchone()
+
+        if row is None:
+            return None
+
+        sha256, size = row
+        blob_path = self.blob_path(sha256)
+
+        if not path.isfile(blob_path) or path.getsize(blob_path) != size:
+            return None
+
+        return sha256, size
+
+    def _index(self, url: str, sha256: str, size: int, etag: str = None):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?)",
+                             (url, sha256, size, etag))
+            self._db.commit()
+
+    def read(self, sha256: str) -> bytes:
+        with open(self.blob_path(sha256), "rb") as f:
+            return f.read()
+
+    def link(self, sha256: str, dest: str):
+        """Places a stored image at dest, replacing whatever is there.
+
+        Arguments:
+            sha256 {str} -- Hash of the image
+            dest {str} -- Path to place the image at
+        """
+
+        part_path = dest + PART_SUFFIX
+
+        if path.lexists(part_path):
+            os.remove(part_path)
+
+        try:
+            os.link(self.blob_path(sha256), part_path)
+        except OSError:
+            # Different filesystem or no hardlink support.
+            shutil.copyfile(self.blob_path(sha256), part_path)
+
+        os.replace(part_path, dest)
+
+    def add(self, url: str, data: bytes, sha256: str, etag: str = None):
+        """Stores an image held in memory.
+
+        Arguments:
+            url {str} -- Url of the image
+            data {bytes} -- Content of the image
+            sha256 {str} -- Hex digest of the content
+
+        Keyword Arguments:
+            etag {str} -- ETag header of the response (default: {None})
+        """
+
+        blob_path = self.blob_path(sha256)
+
+        if not path.isfile(blob_path):
+            create_folders(path.dirname(blob_path))
+            part_path = f"{blob_path}.{threading.get_ident()}{PART_SUFFIX}"
+
+            with open(part_path, "wb") as f:
+                f.write(data)
+
+            os.replace(part_path, blob_path)
+
+        self._index(url, sha256, len(data), etag)
+
+    def add_file(self, url: str, file_path: str, sha256: str, size: int, etag: str = None):
+        """Stores a downloaded image without copying it.
+
+        A new image is hardlinked into the store. If the same content is
+        already stored, file_path is replaced by a link to it so the disk
+        only holds one copy.
+
+        Arguments:
+            url {str} -- Url of the image
+            file_path {str} -- Path of the downloaded image
+            sha256 {str} -- Hex digest of the content
+            size {int} -- Size in bytes
+
+        Keyword Arguments:
+            etag {str} -- ETag header of the response (default: {None})
+        """
+
+        blob_path = self.blob_path(sha256)
+
+        if path.isfile(blob_path):
+            self.link(sha256, file_path)
+        else:
+            create_folders(path.dirname(blob_path))
+
+            try:
+                os.link(file_path, blob_path)
+            except FileExistsError:
+                # Stored by another thread in the meantime.
+                self.link(sha256, file_path)
+            except OSError:
+                part_path = f"{blob_path}.{threading.get_ident()}{PART_SUFFIX}"
+                shutil.copyfile(file_path, part_path)
+                os.replace(part_path, blob_path)
+
+        self._index(url, sha256, size, etag)
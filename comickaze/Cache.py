@@ -0,0 +1,209 @@
+import sqlite3
+import threading
+import time
+from os import path
+
+import requests
+
+from .util import create_folders
+
+SEARCH = "search"
+COMIC = "comic"
+CHAPTER = "chapter"
+
+# Seconds a cached response is served without asking the site again.
+DEFAULT_TTL = {
+    SEARCH: 60 * 60,
+    COMIC: 6 * 60 * 60,
+    CHAPTER: 30 * 24 * 60 * 60
+}
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+CACHE_FILENAME = "cache.sqlite3"
+
+
+class Cache:
+    def __init__(self, cache_dir: str, ttl: dict = None, max_size: int = DEFAULT_MAX_SIZE):
+        """On-disk cache of fetched pages keyed by URL, safe to share between threads.
+
+        Expired entries carrying an ETag or Last-Modified are revalidated with
+        a conditional request instead of being fetched again. Least recently
+        used entries are evicted once the cache grows past max_size.
+
+        Arguments:
+            cache_dir {str} -- Directory of the cache database
+
+        Keyword Arguments:
+            ttl {dict} -- Seconds to live per resource type, merged over the defaults (default: {None})
+            max_size {int} -- Maximum size of the cached bodies in bytes (default: {256 MiB})
+        """
+
+        create_folders(cache_dir)
+
+        self.cache_path = path.join(cache_dir, CACHE_FILENAME)
+        self.ttl = dict(DEFAULT_TTL)
+        self.max_size = max_size
+
+        if ttl is not None:
+            self.ttl.update(ttl)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS entries (
+            url TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            body TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            size INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )""")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self._db.commit()
+
+    def lookup(self, url: str):
+        """Gets a cached entry, fresh or not.
+
+        Arguments:
+            url {str} -- Url
+
+        Returns:
+            dict -- The entry, None if the url is not cached
+        """
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT kind, body, etag, last_modified, fetched_at FROM entries WHERE url = ?", (url,)).fetchone()
+
+            if row is None:
+                return None
+
+            self._db.execute(
+                "UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+
+        kind, body, etag, last_modified, fetched_at = row
+        return {
+            "kind": kind,
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": fetched_at
+        }
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl.get(entry["kind"], 0)
+
+    def store(self, url: str, kind: str, body: str, etag: str = None, last_modified: str = None):
+        now = time.time()
+
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (url, kind, body, etag, last_modified, len(body.encode("utf-8")), now, now))
+            self._evict()
+            self._db.commit()
+
+    def refresh(self, url: str):
+        """Marks an entry as just fetched, after the site confirmed it did not change.
+
+        Arguments:
+            url {str} -- Url
+        """
+
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+        if total <= self.max_size:
+            return
+
+        for url, size in self._db.execute("SELECT url, size FROM entries ORDER BY accessed_at").fetchall():
+            self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            total -= size
+
+            if total <= self.max_size:
+                break
+
+    def get_text(self, fetcher, session: requests.Session, url: str, kind: str, **kwargs) -> str:
+        """Gets the body of a page from the cache, revalidating or fetching it when needed.
+
+        Arguments:
+            fetcher {Fetcher} -- Fetch layer to use on a miss
+            session {requests.Session} -- Session to use on a miss
+            url {str} -- Url
+            kind {str} -- Resource type, one of "search", "comic" or "chapter"
+
+        Returns:
+            str -- Body of the page
+        """
+
+        if "params" in kwargs:
+            url = requests.Request("GET", url, params=kwargs.pop(
+                "params")).prepare().url
+
+        entry = self.lookup(url)
+
+        if entry is not None and self.is_fresh(entry):
+            return entry["body"]
+
+        headers = kwargs.pop("headers", {})
+        headers.update(self.conditional_headers(entry))
+
+        res = fetcher.get(session, url, headers=headers, **kwargs)
+
+        return self.update(url, kind, entry, res.status_code, res.text, res.headers)
+
+    def conditional_headers(self, entry: dict) -> dict:
+        """Headers of a request revalidating an entry.
+
+        Arguments:
+            entry {dict} -- Entry from {Cache.lookup}, None if the url is not cached
+
+        Returns:
+            dict -- If-None-Match and If-Modified-Since when the entry has them
+        """
+
+        headers = {}
+
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        return headers
+
+    def update(self, url: str, kind: str, entry: dict, status: int, body: str, headers) -> str:
+        """Caches the response to a request sent with {Cache.conditional_headers}.
+
+        Arguments:
+            url {str} -- Url
+            kind {str} -- Resource type, one of "search", "comic" or "chapter"
+            entry {dict} -- Entry the request revalidated, None if the url was not cached
+            status {int} -- Status of the response
+            body {str} -- Body of the response
+            headers {dict} -- Headers of the response
+
+        Returns:
+            str -- Body of the page, the cached one if it did not change
+        """
+
+        if status == 304 and entry is not None:
+            self.refresh(url)
+            return entry["body"]
+
+        self.store(url, kind, body, headers.get(
+            "ETag"), headers.get("Last-Modified"))
+
+        return body
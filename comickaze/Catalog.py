@@ -0,0 +1,200 @@
+import difflib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from os import path
+
+from .util import create_folders
+
+CATALOG_FILENAME = "catalog.sqlite3"
+
+# Fuzzy matches scoring below this are dropped, see difflib.SequenceMatcher.ratio.
+DEFAULT_CUTOFF = 0.6
+
+
+def normalize(text: str) -> str:
+    """Lowercases text and strips accents and punctuation, so "Batman: Año Uno" matches "batman ano uno"."""
+
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class Catalog:
+    def __init__(self, catalog_dir: str):
+        """Local index of comics searchable without asking the site, safe to share between threads.
+
+        Entries are gathered from search results and fetched comics. Searches
+        rank exact matches first, then prefix matches on any word of the
+        title, other names or slug, then fuzzy matches of the names.
+
+        Arguments:
+            catalog_dir {str} -- Directory of the catalog database
+        """
+
+        create_folders(catalog_dir)
+
+        self.catalog_path = path.join(catalog_dir, CATALOG_FILENAME)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.catalog_path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS comics (
+            slug TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            other_names TEXT,
+            tags TEXT NOT NULL,
+            categories TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )""")
+        self._db.commit()
+
+        self._entries = {}
+        self._names = {}
+        self._load()
+
+    def _load(self):
+        for row in self._db.execute("SELECT slug, title, other_names, tags, categories, updated_at FROM comics"):
+            slug, title, other_names, tags, categories, updated_at = row
+            self._index({
+                "slug": slug,
+                "title": title,
+                "other_names": other_names,
+                "tags": json.loads(tags),
+                "categories": json.loads(categories),
+                "updated_at": updated_at
+            })
+
+    def _entry_names(self, entry: dict) -> set:
+        names = [entry["title"], entry["slug"].replace("-", " ")]
+        if entry["other_names"]:
+            names += entry["other_names"].split(",")
+
+        return set(normalize(name) for name in names) - {""}
+
+    def _index(self, entry: dict):
+        known = self._entries.get(entry["slug"])
+
+        if known is not None:
+            for name in self._entry_names(known):
+                self._names[name].discard(known["slug"])
+
+                if len(self._names[name]) == 0:
+                    del self._names[name]
+
+        self._entries[entry["slug"]] = entry
+
+        for name in self._entry_names(entry):
+            self._names.setdefault(name, set()).add(entry["slug"])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, slug: str):
+        return slug in self._entries
+
+    def get(self, slug: str) -> dict:
+        return self._entries.get(slug)
+
+    def slugs(self) -> list:
+        with self._lock:
+            return list(self._entries)
+
+    def add(self, slug: str, title: str, other_names: str = None, tags: list = None, categories: list = None):
+        """Adds or updates a comic. Fields left as None keep what the catalog already knows.
+
+        Arguments:
+            slug {str} -- Url slug
+            title {str} -- Title
+
+        Keyword Arguments:
+            other_names {str} -- Comma separated alternative titles (default: {None})
+            tags {list} -- Tags (default: {None})
+            categories {list} -- Categories (default: {None})
+        """
+
+        with self._lock:
+            known = self._entries.get(slug, {})
+            entry = {
+                "slug": slug,
+                "title": title,
+                "other_names": other_names if other_names is not None else known.get("other_names"),
+                "tags": tags if tags is not None else known.get("tags", []),
+                "categories": categories if categories is not None else known.get("categories", []),
+                "updated_at": time.time()
+            }
+
+            self._db.execute("INSERT OR REPLACE INTO comics VALUES (?, ?, ?, ?, ?, ?)",
+                             (slug, title, entry["other_names"], json.dumps(entry["tags"]),
+                              json.dumps(entry["categories"]), entry["updated_at"]))
+            self._db.commit()
+            self._index(entry)
+
+    def add_comic(self, comic):
+        self.add(comic.slug, comic.title, other_names=comic.other_names,
+                 tags=comic.tags, categories=comic.categories)
+
+    def search(self, query: str, limit: int = 10, cutoff: float = DEFAULT_CUTOFF, fuzzy: bool = True) -> list:
+        """Searches the catalog.
+
+        Arguments:
+            query {str} -- Title, alternative title or slug, whole or the start of its words
+
+        Keyword Arguments:
+            limit {int} -- Maximum number of results (default: {10})
+            cutoff {float} -- Similarity from 0 to 1 a fuzzy match needs (default: {0.6})
+            fuzzy {bool} -- Fill up the results with similar names (default: {True})
+
+        Returns:
+            list[dict] -- Matching entries, best first
+        """
+
+        query = normalize(query)
+
+        if not query:
+            return []
+
+        words = query.split()
+        slugs = []
+
+        def extend(names):
+            for name in names:
+                for slug in sorted(self._names[name]):
+                    if slug not in slugs:
+                        slugs.append(slug)
+
+        # Every word of the query starts a word of the name, in order.
+        pattern = re.compile(
+            r"\b" + r"\w*\W+(?:\w+\W+)*?".join(re.escape(word) for word in words))
+
+        with self._lock:
+            if query in self._names:
+                extend([query])
+
+            extend(sorted((name for name in self._names if pattern.search(name)), key=len))
+
+            if fuzzy and len(slugs) < limit:
+                extend(self._fuzzy(query, len(words), limit, cutoff))
+
+            return [self._entries[slug] for slug in slugs[:limit]]
+
+    def _fuzzy(self, query: str, words: int, limit: int, cutoff: float) -> list:
+        # Names are also compared by their first words so a misspelled
+        # "batmn" still finds "batman the long halloween".
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+
+        scores = {}
+        for name in self._names:
+            for candidate in {name, " ".join(name.split()[:words])}:
+                matcher.set_seq1(candidate)
+
+                if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                    score = matcher.ratio()
+
+                    if score >= cutoff and score > scores.get(name, 0):
+                        scores[name] = score
+
+        return sorted(scores, key=lambda name: (-scores[name], len(name)))[:limit]
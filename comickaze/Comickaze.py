@@ -1,28 +1,78 @@
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import json
 import logging
+import threading
 
-import coloredlogs
 import requests
+from bs4 import SoupStrainer
 
+from .Batch import BatchItem, parse_range
+from .BlobStore import BlobStore
+from .Cache import Cache, SEARCH, COMIC, CHAPTER
+from .Catalog import Catalog
 from .Downloader import Downloader
-from .objects import Suggestion, Comic, Chapter
-from .util import soupify, create_session
+from .exceptions import NoChapterError
+from .Fetcher import Fetcher
+from .Library import Library
+from .Resolver import PageProber, RESOLVERS, HTML, DEFAULT_BATCH_SIZE
+from .Tracing import Tracer, PARSE
+from .objects import Suggestion, Comic, Chapter, PageList
+from .util import soupify, find_page_list, create_session, install_logging, DEFAULT_POOL_SIZE
+
+COMIC_STRAINER = SoupStrainer("div", attrs={"class": "col-sm-12"})
+PAGE_LIST_STRAINER = SoupStrainer("select", attrs={"id": "page-list"})
 
 
 class Comickaze:
     BASE_URL = "https://readcomicsonline.ru"
 
-    def __init__(self, log_level: str = "ERROR"):
+    def __init__(self, log_level: str = "ERROR", pool_size: int = DEFAULT_POOL_SIZE, fetcher: Fetcher = None,
+                 cache: Cache = None, parser: str = None, store: BlobStore = None, resolver: str = HTML,
+                 catalog: Catalog = None, tracer: Tracer = None):
         """Comickaze instance
 
         Keyword Arguments:
             log_level {str} -- Log level (default: {"ERROR"})
+            pool_size {int} -- Connections kept alive per host, the session is shared by the page discovery threads (default: {10})
+            fetcher {Fetcher} -- Fetch layer handling timeouts, retries and rate limiting, shared with the downloaders
+                                 created by this instance (default: {Fetcher()})
+            cache {Cache} -- On-disk cache of search results, comic and chapter pages, None to disable (default: {None})
+            parser {str} -- BeautifulSoup tree builder, "lxml" or "html.parser". Defaults to lxml when it is installed (default: {None})
+            store {BlobStore} -- Content-addressed image store shared with the downloaders created by this instance,
+                                 None to disable (default: {None})
+            resolver {str} -- How chapter pages are found. "html" parses the chapter's reader page, "probe" and
+                              "binary" skip it and count the page images with HEAD requests, see {PageProber}.
+                              Probing falls back to the reader page when it finds nothing (default: {"html"})
+            catalog {Catalog} -- Local index of comics, filled with every search result and fetched comic and
+                                 used by {Comickaze.search_many}, None to disable (default: {None})
+            tracer {Tracer} -- Times parsing here and fetches, conversion and disk writes in the downloaders created
+                               by this instance, defaults to the fetcher's (default: {None})
         """
         self.log_level = log_level
         self.logger = logging.getLogger(__name__)
-        coloredlogs.install(level=log_level, logger=self.logger)
+        install_logging(log_level)
+
+        self.session = create_session(pool_size=pool_size)
+        self.fetcher = fetcher if fetcher is not None else Fetcher(
+            tracer=tracer)
+        self.tracer = tracer if tracer is not None else self.fetcher.tracer
+        self.cache = cache
+        self.parser = parser
+        self.store = store
+
+        if resolver not in RESOLVERS:
+            raise ValueError(f"Unknown resolver: {resolver}")
+
+        self.resolver = resolver
+        self.catalog = catalog
+        self._probe_sessions = threading.local()
 
-        self.session = create_session()
+    def _get_text(self, url: str, kind: str, **kwargs) -> str:
+        if self.cache is not None:
+            return self.cache.get_text(self.fetcher, self.session, url, kind, **kwargs)
+
+        return self.fetcher.get(self.session, url, **kwargs).text
 
     def search_comics(self, query: str) -> list:
         """Searches comics
@@ -35,15 +85,107 @@ class Comickaze:
         """
 
         self.logger.info(f"Searching for {query}...")
-        res = self.session.get("{0}/search".format(self.BASE_URL), params={
+        body = self._get_text("{0}/search".format(self.BASE_URL), SEARCH, params={
             "query": query
         })
 
-        suggestions = res.json()["suggestions"]
+        suggestions = json.loads(body)["suggestions"]
         self.logger.info(f"Search done. Found {len(suggestions)} suggestions.")
 
+        if self.catalog is not None:
+            for suggestion in suggestions:
+                self.catalog.add(suggestion["data"], suggestion["value"])
+
         return [Suggestion(self, suggestion["value"], suggestion["data"]) for suggestion in suggestions]
 
+    def search_many(self, queries: List[str], limit: int = 10, number_of_threads: int = 4, fuzzy: bool = False) -> dict:
+        """Searches many comics, answering from the catalog first and asking the site only for the misses.
+
+        Only whole names and names whose words start with the query count
+        as catalog answers, a query with just similar names is a miss
+        unless fuzzy is set.
+        Without a catalog every query goes to the site.
+
+        Arguments:
+            queries {List[str]} -- Queries
+
+        Keyword Arguments:
+            limit {int} -- Maximum number of catalog results per query (default: {10})
+            number_of_threads {int} -- Number of remote searches at the same time (default: {4})
+            fuzzy {bool} -- Also answer with similar names from the catalog (default: {False})
+
+        Returns:
+            dict -- List of {Suggestion} per query, empty if the remote search failed
+        """
+
+        results = {}
+        misses = []
+
+        for query in dict.fromkeys(queries):
+            entries = self.catalog.search(
+                query, limit=limit, fuzzy=fuzzy) if self.catalog is not None else []
+
+            if len(entries) > 0:
+                results[query] = [Suggestion(self, entry["title"], entry["slug"])
+                                  for entry in entries]
+            else:
+                misses.append(query)
+
+        self.logger.info(
+            f"{len(results)} of {len(results) + len(misses)} queries answered by the catalog.")
+
+        def search(query: str) -> list:
+            try:
+                return self.search_comics(query)
+            except Exception:
+                self.logger.exception(f"Failed to search for {query}.")
+                return []
+
+        with ThreadPoolExecutor(max_workers=max(number_of_threads, 1)) as executor:
+            results.update(zip(misses, executor.map(search, misses)))
+
+        return results
+
+    def refresh_catalog(self, links: List[str] = None, number_of_threads: int = 4) -> List[str]:
+        """Fetches every comic of the catalog again to update its entry.
+
+        Keyword Arguments:
+            links {List[str]} -- Links or slugs of comics to add to the catalog as well (default: {None})
+            number_of_threads {int} -- Number of comics fetched at the same time (default: {4})
+
+        Returns:
+            List[str] -- Links that could not be fetched
+        """
+
+        if self.catalog is None:
+            raise ValueError("This instance has no catalog.")
+
+        links = [self.get_comic_link(link) for link in (links or [])]
+        links = list(dict.fromkeys(links + [self.get_comic_link(slug)
+                                            for slug in self.catalog.slugs()]))
+
+        def fetch(link: str):
+            try:
+                self.get_comic(link)
+            except Exception:
+                self.logger.exception(f"Failed to refresh {link}.")
+                return link
+
+        with ThreadPoolExecutor(max_workers=max(number_of_threads, 1)) as executor:
+            return [link for link in executor.map(fetch, links) if link is not None]
+
+    def get_comic_link(self, comic: str) -> str:
+        """Turns a comic slug into its link, links are returned as they are.
+
+        Arguments:
+            comic {str} -- Link or slug
+
+        Returns:
+            str -- Link
+        """
+
+        return comic if "/" in comic else f"{self.BASE_URL}/comic/{comic}"
+
     def get_comic(self, link: str) -> Comic:
         """Gets information about the comic in the given link
 
@@ -56,7 +198,7 @@ class Comickaze:
 
         try:
             self.logger.info(f"Trying to access {link}")
-            res = self.session.get(link)
+            markup = self._get_text(link, COMIC)
         except:
             self.logger.error(
                 f"Something went wrong accessing the page: {link}.")
@@ -64,7 +206,11 @@ class Comickaze:
 
         try:
             self.logger.info(f"Trying to parse the page...")
-            soup = soupify(res.text)
+            # Everything we need lives in the first col-sm-12 div, skip
+            # building the rest of the page.
+            with self.tracer.span("parse comic", PARSE, url=link):
+                soup = soupify(markup, parser=self.parser,
+                               parse_only=COMIC_STRAINER)
 
             col = soup.find("div", attrs={"class": "col-sm-12"})
 
@@ -72,13 +218,13 @@ class Comickaze:
 
             title = list_container.find(
                 "h2", attrs={"class": "listmanga-header"}).text.strip()
-            self.logger.debug(f"Found title: {title}")
+            self.logger.debug("Found title: %s", title)
 
             comic = Comic(title, link)
 
             image = list_container.find("img", attrs={"img-responsive"})["src"]
             comic.image = "https://www." + image[2:]
-            self.logger.debug(f"Found image: {comic.image}")
+            self.logger.debug("Found image: %s", comic.image)
 
             info_box = col.find("dl", attrs={"class": "dl-horizontal"})
 
@@ -131,11 +277,11 @@ class Comickaze:
                     comic.rating = rating
                     val = rating
 
-                self.logger.debug(f"Found {tag}: {val}")
+                self.logger.debug("Found %s: %s", tag, val)
 
             comic.summary = col.find("div", attrs={"class": "manga well"}).find(
                 "p").text.strip()
-            self.logger.debug(f"Found summary: {comic.summary}")
+            self.logger.debug("Found summary: %s", comic.summary)
 
             li_chapters = col.find("ul", attrs={"class": "chapters"}).find_all(
                 "li", attrs={"class": "volume-0"})
@@ -159,6 +305,9 @@ class Comickaze:
             self.logger.info(
                 f"Found {title} with {len(comic.chapters)} chapter(s).")
 
+            if self.catalog is not None:
+                self.catalog.add_comic(comic)
+
             return comic
         except:
             self.logger.error(
@@ -168,44 +317,112 @@ class Comickaze:
     def get_chapter_pages(self, chapter: Chapter):
         """Gets the chapter's pages. URL of the pages images.
 
+        Fetches the chapter on every call and replaces {Chapter.pages},
+        {Chapter.get_pages} only fetches it once.
+
         Arguments:
             chapter {Chapter} -- Chapter
 
         Returns:
-            list -- List of image urls
+            PageList -- List of image urls
         """
 
+        with self.tracer.span("resolve", PARSE, url=chapter.link, resolver=self.resolver):
+            if self.resolver != HTML and self._probe_chapter_pages(chapter):
+                return chapter.pages
+
+            link = chapter.link
+
+            try:
+                markup = self._get_text(link, CHAPTER)
+            except:
+                self.logger.error(
+                    f"Something went wrong accessing the page: {link}.")
+                raise
+
+            return self.parse_chapter_pages(chapter, markup)
+
+    def _page_url_prefix(self, chapter: Chapter) -> str:
         link = chapter.link
         chapter_slug = link[link.rfind("/") + 1:]
 
-        image_link_format = f"https://readcomicsonline.ru/uploads/manga/{chapter.comic.slug}/chapters/{chapter_slug}/"
+        return f"{self.BASE_URL}/uploads/manga/{chapter.comic.slug}/chapters/{chapter_slug}/"
 
-        try:
-            res = self.session.get(link)
-        except:
-            self.logger.error(
-                f"Something went wrong accessing the page: {link}.")
-            raise
+    def _probe_session(self) -> requests.Session:
+        # Every discovery thread probes with a batch of HEAD requests at
+        # once, more than the shared session's pool holds.
+        session = getattr(self._probe_sessions, "session", None)
+
+        if session is None:
+            session = create_session(
+                pool_size=DEFAULT_BATCH_SIZE, pool_block=True)
+            self._probe_sessions.session = session
+
+        return session
+
+    def _probe_chapter_pages(self, chapter: Chapter) -> bool:
+        # A cached reader page is cheaper than probing.
+        if self.cache is not None:
+            entry = self.cache.lookup(chapter.link)
+
+            if entry is not None and self.cache.is_fresh(entry):
+                return False
+
+        prefix = self._page_url_prefix(chapter)
+        prober = PageProber(self.fetcher, self._probe_session(),
+                            strategy=self.resolver, batch_size=DEFAULT_BATCH_SIZE)
 
         try:
-            soup = soupify(res.text)
+            count = prober.count(PageList(prefix, []).url)
+        except Exception:
+            self.logger.exception(
+                f"Failed to probe the pages of {chapter.title}.")
+            return False
 
-            pages_select = soup.find("select", attrs={"id": "page-list"})
+        if count == 0:
+            self.logger.debug(
+                "No pages found by probing %s, reading its page instead.", chapter.title)
+            return False
 
-            for option in pages_select.find_all("option"):
-                val = int(option["value"])
-                s_val = str(val)
+        if count >= prober.max_pages:
+            self.logger.debug(
+                "Probing %s found no last page, reading its page instead.", chapter.title)
+            return False
 
-                if val < 10:
-                    s_val = "0" + s_val
+        chapter.pages = PageList(prefix, range(1, count + 1))
+        return True
 
-                chapter.pages.append(image_link_format + f"{s_val}.jpg")
+    def parse_chapter_pages(self, chapter: Chapter, markup: str):
+        """Parses the chapter's reader page and sets {Chapter.pages}.
 
-            return chapter.pages
-        except:
-            self.logger.error(
-                f"Something went wrong parsing the page.")
-            raise
+        Arguments:
+            chapter {Chapter} -- Chapter
+            markup {str} -- HTML of the chapter's reader page
+
+        Returns:
+            PageList -- List of image urls
+        """
+
+        with self.tracer.span("parse chapter", PARSE, url=chapter.link):
+            image_link_format = self._page_url_prefix(chapter)
+
+            try:
+                values = find_page_list(markup)
+
+                if values is None:
+                    soup = soupify(markup, parser=self.parser,
+                                   parse_only=PAGE_LIST_STRAINER)
+                    pages_select = soup.find("select", attrs={"id": "page-list"})
+                    values = [int(option["value"])
+                              for option in pages_select.find_all("option")]
+
+                chapter.pages = PageList(image_link_format, values)
+
+                return chapter.pages
+            except:
+                self.logger.error(
+                    f"Something went wrong parsing the page.")
+                raise
 
     def create_downloader(self, chapters: List[Chapter], number_of_threads=4, output_format="cbz", **kwargs) -> Downloader:
         """Wrapper function to create a Downloader object.
@@ -221,4 +438,133 @@ class Comickaze:
             Downloader -- Downloader object
         """
 
+        kwargs.setdefault("fetcher", self.fetcher)
+        kwargs.setdefault("store", self.store)
+        kwargs.setdefault("tracer", self.tracer)
+
         return Downloader(chapters, output_format=output_format, number_of_threads=number_of_threads, log_level=self.log_level, **kwargs)
+
+    def sync(self, library: Library, download_dir: str, **kwargs) -> List[Chapter]:
+        """Downloads the chapters of every followed comic that are not in the library yet.
+
+        Every comic page is fetched again, conditionally if the cache allows
+        it, and all new chapters go through a single {Downloader} run.
+
+        Arguments:
+            library {Library} -- Library of followed comics
+            download_dir {str} -- Download directory
+
+        Keyword Arguments:
+            **kwargs -- Passed to {Comickaze.create_downloader}
+
+        Returns:
+            List[Chapter] -- Chapters downloaded and added to the library
+        """
+
+        chapters = []
+        for entry in list(library.comics.values()):
+            try:
+                comic = self.get_comic(entry["link"])
+            except Exception:
+                self.logger.error(f"Skipping {entry['title']}.")
+                continue
+
+            # The site lists the newest chapter first.
+            new_chapters = library.new_chapters(comic)
+            new_chapters.reverse()
+
+            self.logger.info(
+                f"{comic.title}: {len(new_chapters)} new chapter(s).")
+            chapters.extend(new_chapters)
+
+        if len(chapters) == 0:
+            return []
+
+        # A whole comic CBZ would be overwritten by the next sync's chapters,
+        # one archive per chapter keeps the library incremental.
+        kwargs.setdefault("streaming", True)
+
+        downloader = self.create_downloader(chapters, **kwargs)
+        downloader.start(download_dir)
+
+        library.mark_downloaded(downloader.completed_chapters)
+        library.save()
+
+        return downloader.completed_chapters
+
+    def batch_download(self, items: List[BatchItem], download_dir: str, number_of_discovery_threads: int = 4, **kwargs) -> List[dict]:
+        """Downloads chapters of many comics at once without any prompt.
+
+        Comics are fetched concurrently, then the selected chapters of all of
+        them go through a single {Downloader} run sharing its workers and
+        sessions.
+
+        Arguments:
+            items {List[BatchItem]} -- Comics and chapter ranges, see {Batch.parse_batch}
+            download_dir {str} -- Download directory
+
+        Keyword Arguments:
+            number_of_discovery_threads {int} -- Number of comics fetched at the same time (default: {4})
+            **kwargs -- Passed to {Comickaze.create_downloader}
+
+        Returns:
+            List[dict] -- Result of every item, in the given order
+        """
+
+        def fetch(link: str):
+            try:
+                return self.get_comic(link)
+            except Exception as e:
+                return e
+
+        links = list(dict.fromkeys(self.get_comic_link(item.comic) for item in items))
+
+        with ThreadPoolExecutor(max_workers=max(number_of_discovery_threads, 1)) as executor:
+            comics = dict(zip(links, executor.map(fetch, links)))
+
+        resolved = []
+        for item in items:
+            link = self.get_comic_link(item.comic)
+            comic = comics[link]
+            result = {"item": item.line, "link": link, "title": None,
+                      "requested": 0, "completed": 0, "failed": [], "error": None}
+            selected = []
+
+            try:
+                if isinstance(comic, Exception):
+                    raise comic
+
+                # The site lists the newest chapter first, ranges count from the first one.
+                chapters = list(reversed(comic.chapters))
+                selected = [chapters[i]
+                            for i in parse_range(item.chapters, len(chapters))]
+
+                result["title"] = comic.title
+
+                if len(selected) == 0:
+                    raise NoChapterError(
+                        f"{comic.title} has no chapter in range {item.chapters}.")
+
+                result["requested"] = len(selected)
+            except Exception as e:
+                result["error"] = str(e)
+
+            resolved.append((result, selected))
+
+        # Overlapping ranges of the same comic download each chapter once.
+        chapters = list(dict.fromkeys(
+            chapter for _, selected in resolved for chapter in selected))
+
+        if len(chapters) > 0:
+            downloader = self.create_downloader(
+                chapters, number_of_discovery_threads=number_of_discovery_threads, **kwargs)
+            downloader.start(download_dir)
+
+            completed = set(downloader.completed_chapters)
+            for result, selected in resolved:
+                result["completed"] = len(
+                    [chapter for chapter in selected if chapter in completed])
+                result["failed"] = [
+                    chapter.title for chapter in selected if chapter not in completed]
+
+        return [result for result, _ in resolved]
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+
+from .Fetcher import RETRY_STATUSES
+
+
+class AdaptiveLimiter:
+    def __init__(self, min_limit: int = 1, max_limit: int = 16, initial: int = None, window: float = 2.0,
+                 backoff: float = 0.5, latency_tolerance: float = 2.0, error_threshold: float = 0.05):
+        """Limits how many workers run at once and tunes the limit AIMD style.
+
+        Request outcomes are grouped in windows. A window with throttling,
+        too many errors, or a mean latency past latency_tolerance times the
+        best window seen multiplies the limit by backoff. A healthy window
+        in which the limit was reached raises it by one.
+
+        Keyword Arguments:
+            min_limit {int} -- Lowest limit (default: {1})
+            max_limit {int} -- Highest limit, the number of workers (default: {16})
+            initial {int} -- Starting limit, defaults to min(4, max_limit) (default: {None})
+            window {float} -- Seconds between adjustments (default: {2.0})
+            backoff {float} -- Factor the limit is multiplied by on congestion (default: {0.5})
+            latency_tolerance {float} -- Mean latency over the best one that counts as congestion (default: {2.0})
+            error_threshold {float} -- Share of failed requests that counts as congestion (default: {0.05})
+        """
+
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.initial = initial if initial is not None else min(
+            4, self.max_limit)
+        self.window = window
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+
+        self.logger = logging.getLogger(__name__)
+        self._condition = threading.Condition()
+        self.reset()
+
+    def reset(self):
+        with self._condition:
+            self.limit = min(max(self.initial, self.min_limit), self.max_limit)
+            self.active = 0
+            self.history = [(time.time(), self.limit)]
+            self.best_latency = None
+            self._start_window()
+            self._condition.notify_all()
+
+    def _start_window(self):
+        self._window_started_at = time.monotonic()
+        self._requests = 0
+        self._errors = 0
+        self._throttled = 0
+        self._latency_sum = 0
+        self._saturated = self.active >= self.limit
+
+    def acquire(self):
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+
+            self.active += 1
+
+            if self.active >= self.limit:
+                self._saturated = True
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def observe(self, latency: float, status: int = None):
+        """Records the outcome of a request, meant as a {Metrics} request callback.
+
+        Arguments:
+            latency {float} -- Seconds the request took
+
+        Keyword Arguments:
+            status {int} -- Status code, None when the connection failed (default: {None})
+        """
+
+        with self._condition:
+            self._requests += 1
+            self._latency_sum += latency
+
+            if status == 429:
+                self._throttled += 1
+            elif status is None or status in RETRY_STATUSES:
+                self._errors += 1
+
+            if time.monotonic() - self._window_started_at >= self.window:
+                self._adjust()
+                self._start_window()
+
+    def on_request(self, event: str, data: dict):
+        self.observe(data["latency"], data["status"])
+
+    def _adjust(self):
+        if self._requests == 0:
+            return
+
+        latency = self._latency_sum / self._requests
+        error_rate = (self._errors + self._throttled) / self._requests
+
+        congested = self._throttled > 0 or error_rate > self.error_threshold or (
+            self.best_latency is not None and latency > self.best_latency * self.latency_tolerance)
+
+        if self.best_latency is None or latency < self.best_latency:
+            self.best_latency = latency
+
+        if congested:
+            limit = max(self.min_limit, int(self.limit * self.backoff))
+        elif self._saturated:
+            limit = min(self.max_limit, self.limit + 1)
+        else:
+            limit = self.limit
+
+        if limit != self.limit:
+            self.logger.info(
+                f"Concurrency {self.limit} -> {limit} (latency {latency:.3f}s, error rate {error_rate:.1%}).")
+
+            self.limit = limit
+            self.history.append((time.time(), limit))
+            self._condition.notify_all()
@@ -1,9 +1,15 @@
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from os import path
-from zipfile import ZipFile, ZIP_DEFLATED
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
 
 import img2pdf
 
+from .Manifest import MANIFEST_FILENAME, PART_SUFFIX
+from .PDFWriter import PDFWriter
+from .Transform import WEBP, transform_images, summarize
 from .util import create_folders, delete_folders, clean_filename
 
 PDF = "pdf"
@@ -16,11 +22,125 @@ def get_clean_output_path(output):
     return path.join(path.dirname(output), filename)
 
 
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+
 def get_images(dir):
-    return [path.join(dir, img) for img in os.listdir(dir) if img.endswith(".jpg") or img.endswith(".png")]
+    return sorted(path.join(dir, img) for img in os.listdir(dir) if img.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def get_compress_type(filename):
+    # Images are already compressed, deflating them only burns CPU.
+    return ZIP_STORED if filename.lower().endswith(IMAGE_EXTENSIONS) else ZIP_DEFLATED
+
+
+class CBZWriter:
+    def __init__(self, output, order=None):
+        """CBZ archive that pages are appended to as they arrive, safe to share between threads.
+
+        The archive is written to output + ".part" and only renamed to output
+        by {CBZWriter.close}, so an unfinished archive is never mistaken for a
+        complete one. With an order, pages arriving out of order are listed in
+        reading order by the central directory, which is what readers go by.
+
+        Arguments:
+            output {str} -- Path of the archive
+
+        Keyword Arguments:
+            order {list} -- Archive names in reading order, names not in it go last. Entries keep the
+                            order they were added in when None (default: {None})
+        """
+
+        self.output = get_clean_output_path(output)
+        self.part_path = self.output + PART_SUFFIX
+        self.order = order
+        self._lock = threading.Lock()
+
+        create_folders(path.dirname(self.output))
+        self._zip = ZipFile(self.part_path, "w", ZIP_STORED)
+
+    def add(self, arc_name, data: bytes):
+        with self._lock:
+            self._zip.writestr(arc_name, data,
+                               compress_type=get_compress_type(arc_name))
+
+    def add_file(self, file_path, arc_name):
+        with self._lock:
+            self._zip.write(file_path, arc_name,
+                            compress_type=get_compress_type(arc_name))
+
+    def close(self, complete=True):
+        """Closes the archive.
+
+        Keyword Arguments:
+            complete {bool} -- Move the archive to its final path, otherwise it is left as a .part file (default: {True})
+        """
+
+        with self._lock:
+            if self.order is not None:
+                ranks = {name: rank for rank, name in enumerate(self.order)}
+                self._zip.filelist.sort(
+                    key=lambda info: ranks.get(info.filename, len(ranks)))
+
+            self._zip.close()
+
+        if complete:
+            os.replace(self.part_path, self.output)
+
+
+def transform_dirs(transform, dirs, processes=None) -> dict:
+    """Applies a {Transform} to the images of directories on a process pool.
 
+    Arguments:
+        transform {Transform} -- Transform
+        dirs {list} -- Directories
+
+    Keyword Arguments:
+        processes {int} -- Size of the process pool, defaults to the number of CPUs (default: {None})
+
+    Returns:
+        dict -- Throughput and size savings, see {summarize}
+    """
+
+    images = [image for directory in dirs for image in get_images(directory)]
+    started_at = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = transform_images(transform, images, executor=executor)
+
+    return summarize(results, time.perf_counter() - started_at)
+
+
+def get_chapter_dirs(comic_dir):
+    return sorted(path.join(comic_dir, d) for d in os.listdir(comic_dir)
+                  if path.isdir(path.join(comic_dir, d)))
+
+
+def check_pdf_transform(transform):
+    if transform is not None and transform.image_format == WEBP:
+        raise ValueError("WebP pages are not supported in PDFs.")
+
+
+def to_CBZ(comic_dir, delete=True, transform=None, processes=None, **kwargs):
+    """Packs a comic directory into a CBZ archive next to it.
+
+    Arguments:
+        comic_dir {str} -- Comic directory
+
+    Keyword Arguments:
+        delete {bool} -- Delete the comic directory afterwards (default: {True})
+        transform {Transform} -- Re-encodes the pages before packing them (default: {None})
+        processes {int} -- Size of the process pool running the transform (default: {None})
+
+    Returns:
+        dict -- Transform throughput and size savings, None without a transform
+    """
+
+    stats = None
+    if transform is not None:
+        stats = transform_dirs(
+            transform, [comic_dir] + get_chapter_dirs(comic_dir), processes)
 
-def to_CBZ(comic_dir, delete=True, **kwargs):
     output_dir = path.dirname(comic_dir)
     filename = path.basename(comic_dir) + ".cbz"
 
@@ -38,24 +158,96 @@ def to_CBZ(comic_dir, delete=True, **kwargs):
 
     output = path.join(output_dir, filename)
 
-    with ZipFile(output, "w", ZIP_DEFLATED) as handle:
+    with ZipFile(output, "w", ZIP_STORED) as handle:
         rel_root = path.abspath(path.join(comic_dir, os.pardir))
 
         for root, _, files in os.walk(comic_dir):
             handle.write(root, path.relpath(root, rel_root))
 
             for file in files:
+                # Skip the download manifest and unfinished pages.
+                if file == MANIFEST_FILENAME or file.endswith(PART_SUFFIX):
+                    continue
+
                 _filename = path.join(root, file)
 
                 if path.isfile(_filename):
                     arc_name = path.join(path.relpath(root, rel_root), file)
-                    handle.write(_filename, arc_name)
+                    handle.write(_filename, arc_name,
+                                 compress_type=get_compress_type(file))
 
     if delete:
         delete_folders(comic_dir)
 
+    return stats
+
+
+def is_jpeg(file):
+    return file.lower().endswith((".jpg", ".jpeg"))
+
+
+def chapter_to_PDF(chapter_dir, output_dir=None, delete=True):
+    """Converts a single chapter directory into a PDF. Safe to run in a worker process.
+
+    JPEG pages are streamed into the PDF one at a time with {PDFWriter}, so
+    memory does not grow with the chapter. Chapters with other image types
+    go through img2pdf.
+
+    Arguments:
+        chapter_dir {str} -- Chapter directory
+
+    Keyword Arguments:
+        output_dir {str} -- Directory of the PDF, defaults to the chapter's parent directory (default: {None})
+        delete {bool} -- Delete the chapter directory afterwards (default: {True})
+
+    Returns:
+        str -- Path of the PDF
+    """
+
+    if output_dir is None:
+        output_dir = path.dirname(chapter_dir)
+
+    output = path.join(output_dir, path.basename(chapter_dir) + ".pdf")
+    images = get_images(chapter_dir)
+
+    if all(is_jpeg(image) for image in images):
+        with PDFWriter(output) as writer:
+            for image in images:
+                writer.add_image(image)
+    else:
+        with open(output + PART_SUFFIX, "wb") as f:
+            f.write(img2pdf.convert(images))
+
+        os.replace(output + PART_SUFFIX, output)
+
+    if delete:
+        delete_folders(chapter_dir)
+
+    return output
+
+
+def to_PDF(comic_dir, delete=True, transform=None, processes=None, **kwargs):
+    """Converts every chapter directory of a comic into its own PDF.
+
+    Arguments:
+        comic_dir {str} -- Comic directory
+
+    Keyword Arguments:
+        delete {bool} -- Delete the chapter directories afterwards (default: {True})
+        transform {Transform} -- Re-encodes the pages before converting them, JPEG only (default: {None})
+        processes {int} -- Size of the process pool running the transform (default: {None})
+
+    Returns:
+        dict -- Transform throughput and size savings, None without a transform
+    """
+
+    check_pdf_transform(transform)
+
+    stats = None
+    if transform is not None:
+        stats = transform_dirs(
+            transform, get_chapter_dirs(comic_dir), processes)
 
-def to_PDF(comic_dir, delete=True, **kwargs):
     output_dir = comic_dir
 
     if "output_dir" in kwargs:
@@ -67,10 +259,49 @@ def to_PDF(comic_dir, delete=True, **kwargs):
         chapter_dir = path.join(comic_dir, chapter_dir)
 
         if path.isdir(chapter_dir):
-            filename = path.basename(chapter_dir) + ".pdf"
+            chapter_to_PDF(chapter_dir, output_dir, delete=delete)
+
+    return stats
 
-            with open(path.join(output_dir, filename), "wb") as f:
-                f.write(img2pdf.convert(get_images(chapter_dir)))
 
-            if delete:
-                delete_folders(chapter_dir)
+def to_merged_PDF(comic_dir, chapter_dirs=None, delete=True, transform=None, processes=None, **kwargs):
+    """Streams every chapter of a comic into a single PDF next to the comic directory.
+
+    Arguments:
+        comic_dir {str} -- Comic directory
+
+    Keyword Arguments:
+        chapter_dirs {list} -- Chapter directories in reading order, defaults to the sorted subdirectories (default: {None})
+        delete {bool} -- Delete the comic directory afterwards (default: {True})
+        transform {Transform} -- Re-encodes the pages before converting them, JPEG only (default: {None})
+        processes {int} -- Size of the process pool running the transform (default: {None})
+
+    Returns:
+        str -- Path of the PDF
+    """
+
+    check_pdf_transform(transform)
+
+    output_dir = path.dirname(comic_dir)
+
+    if "output_dir" in kwargs:
+        if path.isdir(kwargs["output_dir"]):
+            output_dir = kwargs["output_dir"]
+
+    if chapter_dirs is None:
+        chapter_dirs = get_chapter_dirs(comic_dir)
+
+    if transform is not None:
+        transform_dirs(transform, chapter_dirs, processes)
+
+    create_folders(output_dir)
+    output = path.join(output_dir, path.basename(comic_dir) + ".pdf")
+
+    with PDFWriter(output) as writer:
+        for chapter_dir in chapter_dirs:
+            writer.add_images(get_images(chapter_dir))
+
+    if delete:
+        delete_folders(comic_dir)
+
+    return output
@@ -1,24 +1,57 @@
 from typing import List
 
-from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from os import path, listdir
+import hashlib
+import os
+import shutil
+import queue
 import threading
-import time
 import logging
 
-import coloredlogs
+import requests
 from progress.bar import IncrementalBar as ProgressBar
 
 from . import Comickaze
-from .exceptions import NoChapterError
+from .exceptions import NoChapterError, VerificationError, DiskSpaceError
 from .Converter import CBZ, PDF, IMG
-from .Converter import to_CBZ, to_PDF
-from .util import create_session, clean_filename, create_folders, delete_folders
+from .Converter import chapter_to_PDF, get_images, check_pdf_transform, CBZWriter
+from .PDFWriter import PDFWriter
+from .Transform import Transform, transform_images
+from .Pipeline import Stage, StagingGate, verify_image_file, verify_image_data, check_image_signature, get_content_length
+from .Pipeline import HEAD_SIZE, TAIL_SIZE
+from .util import create_session, clean_filename, create_folders, delete_folders, preallocate, install_logging
 from .objects import Chapter, Comic
+from .AsyncEngine import AsyncEngine
+from .Fetcher import Fetcher
+from .Concurrency import AdaptiveLimiter
+from .Metrics import Metrics, REQUEST
+from .Manifest import Manifest, PART_SUFFIX
+from .BlobStore import BlobStore
+from .Tracing import Tracer, NULL_TRACER, DISK, CONVERT, CHAPTER
+
+THREAD = "thread"
+ASYNC = "async"
+
+SHARED = "shared"
+PER_WORKER = "per-worker"
+
+# Assumed size of a page when the server does not announce one.
+DEFAULT_PAGE_SIZE = 512 * 1024
+
+# Bytes read from a page response at a time.
+CHUNK_SIZE = 256 * 1024
 
 
 class Downloader:
-    def __init__(self, chapters: List[Chapter], output_format: str = CBZ, number_of_threads: int = 4, log_level: str = "ERROR", **kwargs):
+    def __init__(self, chapters: List[Chapter], output_format: str = CBZ, number_of_threads: int = 4, log_level: str = "ERROR",
+                 number_of_discovery_threads: int = 4, engine: str = THREAD, session_policy: str = PER_WORKER, resume: bool = True,
+                 fetcher: Fetcher = None, streaming: bool = False,
+                 conversion_processes: int = None, merge_pdf: bool = False, metrics: Metrics = None,
+                 report_path: str = None, adaptive: bool = False, min_threads: int = 1,
+                 store: BlobStore = None, verify: bool = False, max_staged_chapters: int = 4,
+                 transform: Transform = None, staging_limit: int = None, staging_quota: int = None,
+                 check_space: bool = True, tracer: Tracer = None, in_memory: bool = False, **kwargs):
         """Creates a Downloader object
 
         Arguments:
@@ -27,6 +60,47 @@ class Downloader:
         Keyword Arguments:
             number_of_threads {int} -- Number of threads to use when downloading (default: {4})
             output_format {str} -- Coversion format (default: {"cbz"})
+            number_of_discovery_threads {int} -- Number of chapters whose pages are resolved at the same time (default: {4})
+            engine {str} -- Download engine, "thread" or "async". The async engine uses number_of_threads as its
+                            connection limit per host (default: {"thread"})
+            session_policy {str} -- "per-worker" gives every download thread its own session, "shared" makes the
+                                    threads share one session whose pool holds number_of_threads connections
+                                    (default: {"per-worker"})
+            resume {bool} -- Skip pages recorded as complete by a previous run in the comic's manifest (default: {True})
+            fetcher {Fetcher} -- Fetch layer handling timeouts, retries and rate limiting (default: {Fetcher()})
+            streaming {bool} -- CBZ only. Pack pages straight into one archive per chapter as they arrive,
+                                without staging images on disk (default: {False})
+            conversion_processes {int} -- Size of the process pool converting PDF chapters as soon as they finish
+                                          downloading and running the transform, defaults to the number of CPUs
+                                          (default: {None})
+            merge_pdf {bool} -- PDF only. Build one PDF for the whole comic instead of one per chapter (default: {False})
+            metrics {Metrics} -- Collects throughput, latency, retries and chapter timings of each run (default: {Metrics()})
+            report_path {str} -- Writes the metrics of the run to this JSON file once it ends (default: {None})
+            adaptive {bool} -- Thread engine only. Tune the number of active download threads between min_threads
+                               and number_of_threads from the observed latency and error rates (default: {False})
+            min_threads {int} -- Lowest number of active download threads in adaptive mode (default: {1})
+            store {BlobStore} -- Content-addressed image store, known images are linked from it instead of
+                                 downloaded and new ones are added to it, None to disable (default: {None})
+            verify {bool} -- Check that every page is a complete JPEG or PNG of the size the server announced
+                             before it is converted, bad pages are deleted and their chapter fails (default: {False})
+            max_staged_chapters {int} -- Finished chapters waiting for verification or conversion at most, downloads
+                                         pause while the queue is full (default: {4})
+            transform {Transform} -- CBZ and PDF only, not with streaming. Re-encodes the pages of every finished
+                                     chapter on the process pool before converting it (default: {None})
+            staging_limit {int} -- Chapters downloading or waiting for conversion at most, the next chapter
+                                   starts once one is converted. Pages packed into a comic's CBZ or merged PDF
+                                   stay on disk until the archive is complete, so only per-chapter PDFs bound
+                                   disk use with it. None for no limit (default: {None})
+            staging_quota {int} -- Estimated bytes of the chapters downloading or waiting for conversion at most,
+                                   sizes come from the pages downloaded so far or a HEAD request on the
+                                   first page. Bounds disk use like staging_limit. None for no limit (default: {None})
+            check_space {bool} -- Estimate the size of the download and raise DiskSpaceError before starting
+                                  if the download directory's filesystem cannot hold it (default: {True})
+            tracer {Tracer} -- Times disk writes, verification and conversion of every page and chapter, see
+                               {Tracer.export} (default: {NullTracer()})
+            in_memory {bool} -- CBZ only, not with streaming. Keep the pages of a chapter in memory until it is packed
+                                into the comic's archive instead of staging them on disk. Pages are not resumed,
+                                bound the memory with staging_limit or staging_quota (default: {False})
         """
 
         if len(chapters) < 1:
@@ -35,12 +109,68 @@ class Downloader:
         self.chapters = chapters
         self.comic = chapters[0].comic
 
+        # Chapters may come from several comics, each gets its own folder.
+        self.comics = []
+        for chapter in chapters:
+            if chapter.comic not in self.comics:
+                self.comics.append(chapter.comic)
+
         output_format = output_format.lower()
         if output_format not in [CBZ, PDF, IMG]:
             self.output_format = CBZ
 
         self.output_format = output_format
-        self.number_of_threads = number_of_threads
+        self.streaming = streaming and output_format == CBZ
+        self.in_memory = in_memory and output_format == CBZ and not self.streaming
+        self.conversion_processes = conversion_processes
+        self.merge_pdf = merge_pdf and output_format == PDF
+        self.number_of_threads = max(number_of_threads, 1)
+        self.number_of_discovery_threads = max(number_of_discovery_threads, 1)
+
+        engine = engine.lower()
+        if engine not in [THREAD, ASYNC]:
+            raise ValueError(f"Unknown download engine: {engine}")
+
+        self.engine = engine
+
+        if session_policy not in [SHARED, PER_WORKER]:
+            raise ValueError(f"Unknown session policy: {session_policy}")
+
+        self.session_policy = session_policy
+        self.resume = resume
+        self.fetcher = fetcher if fetcher is not None else Fetcher()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.tracer = tracer if tracer is not None else NULL_TRACER
+        self.report_path = report_path
+        self.store = store
+        self.verify = verify
+        self.max_staged_chapters = max(max_staged_chapters, 1)
+        self.staging_limit = max(
+            staging_limit, 1) if staging_limit is not None else None
+        self.staging_quota = staging_quota
+        self.check_space = check_space
+
+        if transform is not None:
+            if self.streaming or self.in_memory or output_format == IMG:
+                raise ValueError(
+                    "Transforms need CBZ or PDF chapters staged on disk, they do not work with streaming, in memory "
+                    "pages or images.")
+
+            if output_format == PDF:
+                check_pdf_transform(transform)
+
+        self.transform = transform
+
+        self.limiter = None
+        if adaptive:
+            if engine == ASYNC:
+                raise ValueError(
+                    "Adaptive concurrency is only supported by the thread engine.")
+
+            self.limiter = AdaptiveLimiter(
+                min_limit=min_threads, max_limit=self.number_of_threads)
+            self.metrics.on(REQUEST, self.limiter.on_request)
+
         self.daemon = True
 
         if "daemon" in kwargs:
@@ -50,128 +180,750 @@ class Downloader:
                 pass
 
         self.logger = logging.getLogger(__name__)
-        coloredlogs.install(level=log_level, logger=self.logger)
+        install_logging(log_level)
+
+        if (staging_limit is not None or staging_quota is not None) and self._keeps_packed_pages():
+            self.logger.warning(
+                "The staging limits do not bound disk use with CBZ or merged PDF output, packed pages stay on disk "
+                "until the comic's archive is complete. Use per-chapter PDFs or in memory pages to bound it.")
 
     def start(self, download_dir: str):
         """Starts the download process.
 
+        Page lists are resolved concurrently and each chapter is queued for
+        download as soon as its pages are known. Finished chapters go through
+        bounded verification and conversion stages while the rest download.
+
         Arguments:
             download_dir {str} -- Download directory
         """
 
+        title = self.comic.title if len(
+            self.comics) == 1 else f"{len(self.comics)} comics"
+
         self.logger.info(
-            f"Attempting to download {self.comic.title}, {len(self.chapters)} chapter(s).")
+            f"Attempting to download {title}, {len(self.chapters)} chapter(s).")
 
         download_dir = path.normpath(download_dir)
-        comic_dir = path.join(
-            download_dir, clean_filename(self.comic.title))
 
-        self.comic_dir = comic_dir
+        self.comic_dirs = {}
+        self.manifests = {}
+        for comic in self.comics:
+            comic_dir = path.join(download_dir, clean_filename(comic.title))
 
-        self.logger.debug(f"Trying to create folders: {comic_dir}")
-        create_folders(comic_dir)
+            self.logger.debug("Trying to create folders: %s", comic_dir)
+            create_folders(comic_dir)
 
-        total_pages = 0
-        for chapter in self.chapters:
-            total_pages += len(chapter.get_pages())
+            self.comic_dirs[comic] = comic_dir
+            self.manifests[comic] = Manifest(comic_dir)
 
-        with ProgressBar(f"Downloading {self.comic.title}", max=total_pages) as bar:
-            start_time = time.time()
+        self.comic_dir = self.comic_dirs[self.comic]
+        self.manifest = self.manifests[self.comic]
+        self.completed_chapters = []
+        self.failed_chapters = []
+        self._page_size = None
 
-            if self.number_of_threads > 1:
-                self.logger.debug("Starting multithreaded download...")
-                self._multi_threaded_download(download_dir, bar=bar)
-            else:
-                self.logger.debug("Starting singlethreaded download...")
-                self._single_threaded_download(download_dir, bar=bar)
+        if self.check_space:
+            self._check_disk_space()
+
+        # The total is only known once every chapter is resolved, the bar's
+        # max grows as discovery goes.
+        with ProgressBar(f"Downloading {title}", max=1) as bar:
+            self.metrics.start()
 
-            end_time = time.time()
+            self._reset_progress(bar=bar)
+            self._start_pipeline()
+
+            try:
+                if self.engine == ASYNC:
+                    self.logger.debug(
+                        "Starting async download with %d connection(s) per host...", self.number_of_threads)
+                    AsyncEngine(self).run(bar=bar)
+                else:
+                    self.logger.debug(
+                        "Starting download with %d thread(s)...", self.number_of_threads)
+                    self._threaded_download(bar=bar)
+            except BaseException:
+                self._abort_pipeline()
+                raise
+
+            self.metrics.finish()
 
             print()
             self.logger.info(
-                f"Download complete! Time elapsed: {end_time - start_time}")
+                f"Download complete! Time elapsed: {self.metrics.elapsed:.2f}s, "
+                f"{self.metrics.pages_per_second:.2f} pages/s, {self.metrics.bytes_per_second / 1024:.2f} KiB/s, "
+                f"{self.metrics.retries} retries.")
+
+            self._finish_pipeline()
+
+            if self.metrics.transformed_pages > 0:
+                report = self.metrics.report()["transform"]
+                self.logger.info(
+                    f"Transformed {report['pages']} page(s), {report['saved']:.1%} smaller, "
+                    f"{report['pages_per_core_second']:.2f} pages/s per core.")
 
-            self._convert()
             self.logger.info(f"Operation done!")
 
-    def _single_threaded_download(self, download_dir: str, **kwargs):
-        session = create_session()
+        if self.report_path is not None:
+            self.metrics.export(self.report_path)
 
-        for i, chapter in enumerate(self.chapters):
-            if "bar" in kwargs:
-                kwargs["bar"].suffix = f"Chapter {i + 1} of {len(self.chapters)}. Estimated time left: %(eta)ds"
+    def _check_disk_space(self):
+        chapters = [chapter for chapter in self.chapters
+                    if not self._is_chapter_complete(chapter)]
 
-            pages = chapter.pages
+        if len(chapters) == 0:
+            return
 
-            chapter_dir = path.join(
-                self.comic_dir, clean_filename(chapter.title))
+        # Memoized, discovery does not resolve the chapter again.
+        try:
+            pages = chapters[0].get_pages()
+        except Exception:
+            self.logger.debug(
+                "Could not estimate the size of the download.", exc_info=True)
+            return
 
-            self.logger.debug(f"Trying to create folders: {chapter_dir}")
-            create_folders(chapter_dir)
+        chapter_size = self._estimate_chapter_size(chapters[0], pages)
+        total = chapter_size * len(chapters)
+        staged = 0
 
-            for page in pages:
-                self._download(page, chapter_dir, session=session)
+        # Staged pages sit next to the growing output until their chapter
+        # is converted, or until the comic's archive is complete when all
+        # chapters go into one.
+        if self._has_conversion() and not self.in_memory:
+            staged = total
 
-                if "bar" in kwargs:
-                    kwargs["bar"].next()
+            if self._converts_chapters():
+                if self.staging_quota is not None:
+                    staged = min(staged, max(self.staging_quota, chapter_size))
 
-    def _multi_threaded_download(self, download_dir: str, **kwargs):
-        for i, chapter in enumerate(self.chapters):
-            pages = chapter.pages
+                if self.staging_limit is not None:
+                    staged = min(staged, self.staging_limit * chapter_size)
 
-            if "bar" in kwargs:
-                kwargs["bar"].suffix = f"Chapter {i + 1} of {len(self.chapters)}. Estimated time left: %(eta)ds"
+        required = total + staged
+        free = shutil.disk_usage(self.comic_dir).free
 
-            chapter_dir = path.join(
-                self.comic_dir, clean_filename(chapter.title))
-            self.logger.debug(f"Trying to create folders: {chapter_dir}")
-            create_folders(chapter_dir)
+        self.logger.debug(
+            "Estimated %.1f MiB needed, %.1f MiB free.", required / 2 ** 20, free / 2 ** 20)
 
-            threads = []
-            mid = int(len(pages) / self.number_of_threads) + 1
-            for i in range(self.number_of_threads):
-                start = i * mid
-                end = start + mid
+        if required > free:
+            raise DiskSpaceError(
+                f"The download needs about {required / 2 ** 20:.1f} MiB but only {free / 2 ** 20:.1f} MiB "
+                f"are free in {self.comic_dir}.")
 
-                if end > len(pages) and (i == self.number_of_threads - 1 and len(pages[end:]) != 0):
-                    end = len(pages)
+    def _estimate_chapter_size(self, chapter: Chapter, pages: List[str]) -> int:
+        if len(pages) == 0:
+            return 0
 
-                chapters_to_download = pages[start:end]
+        if self.metrics.pages > 0:
+            page_size = self.metrics.bytes / self.metrics.pages
+        else:
+            if self._page_size is None:
+                self._page_size = self._probe_page_size(chapter, pages[0])
 
-                if "bar" in kwargs:
-                    t = threading.Thread(target=self._download_pages,
-                                         args=(chapters_to_download, chapter_dir), kwargs={"bar": kwargs["bar"]}, daemon=self.daemon)
-                else:
-                    t = threading.Thread(target=self._download_pages,
-                                         args=(chapters_to_download, chapter_dir), daemon=self.daemon)
+            page_size = self._page_size
+
+        return int(page_size * len(pages))
+
+    def _probe_page_size(self, chapter: Chapter, page: str) -> int:
+        size = None
+
+        try:
+            r = self.fetcher.head(chapter.comickaze.session, page)
+            size = get_content_length(r.headers)
+        except Exception:
+            self.logger.debug(
+                "Could not get the size of %s.", page, exc_info=True)
+
+        return size or DEFAULT_PAGE_SIZE
+
+    def _admit_chapter(self, chapter: Chapter, pages: List[str]):
+        if self.staging_limit is None and self.staging_quota is None:
+            return
+
+        size = 0
+        if self.staging_quota is not None:
+            size = self._estimate_chapter_size(chapter, pages)
 
-                threads.append(t)
-                t.start()
+        self._gate.acquire(chapter, size)
 
-            for thread in threads:
-                thread.join()
+    def _keeps_packed_pages(self) -> bool:
+        return self.merge_pdf or (self.output_format == CBZ and not self.streaming and not self.in_memory)
 
-    def _convert(self, **kwargs):
-        self.logger.info(f"Converting into {self.output_format} format.")
+    def _has_conversion(self) -> bool:
+        return not self.streaming and self.output_format != IMG
 
-        if self.output_format == CBZ:
-            to_CBZ(self.comic_dir, self.comic.title)
-        elif self.output_format == PDF:
-            to_PDF(self.comic_dir)
+    def _stages_on_disk(self) -> bool:
+        return not self.streaming and not self.in_memory
+
+    def _converts_chapters(self) -> bool:
+        return self.output_format == PDF and not self.merge_pdf
+
+    def _uses_processes(self) -> bool:
+        return self._converts_chapters() or self.transform is not None
+
+    def _threaded_download(self, **kwargs):
+        jobs = queue.Queue()
+
+        if self.limiter is not None:
+            self.limiter.reset()
+
+        if self.session_policy == SHARED:
+            self._session = create_session(
+                pool_size=self.number_of_threads, pool_block=True)
+
+        discovery = threading.Thread(target=self._discover,
+                                     args=(jobs,), kwargs=kwargs, daemon=self.daemon)
+
+        threads = []
+        for _ in range(self.number_of_threads):
+            t = threading.Thread(target=self._download_worker,
+                                 args=(jobs,), kwargs=kwargs, daemon=self.daemon)
+            threads.append(t)
+
+        self._discovery_error = None
+
+        discovery.start()
+        for thread in threads:
+            thread.start()
+
+        discovery.join()
+        for thread in threads:
+            thread.join()
+
+        if self._discovery_error is not None:
+            raise self._discovery_error
+
+    def _discover(self, jobs: queue.Queue, **kwargs):
+        try:
+            self._discover_chapters(jobs, **kwargs)
+        except Exception as e:
+            # Raised again by the calling thread once the workers are done.
+            self._discovery_error = e
+        finally:
+            # One sentinel per worker, queued after every page job.
+            for _ in range(self.number_of_threads):
+                jobs.put(None)
+
+    def _discover_chapters(self, jobs: queue.Queue, **kwargs):
+        chapters = []
+        for chapter in self.chapters:
+            if self._is_chapter_complete(chapter):
+                self.logger.debug(
+                    "Skipping %s, already downloaded.", chapter.title)
+                self._register_chapter(chapter, [], **kwargs)
+            else:
+                chapters.append(chapter)
+
+        with ThreadPoolExecutor(max_workers=self.number_of_discovery_threads) as executor:
+            futures = {executor.submit(chapter.get_pages): chapter
+                       for chapter in chapters}
+
+            for future in as_completed(futures):
+                chapter = futures[future]
+
+                try:
+                    pages = future.result()
+                except Exception:
+                    self.logger.exception(
+                        f"Failed to get the pages of {chapter.title}.")
+                    self._register_chapter(chapter, [], failed=True, **kwargs)
+                    continue
+
+                # Blocks while the staging limits are reached.
+                self._admit_chapter(chapter, pages)
+                self._queue_chapter(jobs, chapter, pages, **kwargs)
+
+    def _queue_chapter(self, jobs: queue.Queue, chapter: Chapter, pages: List[str], **kwargs):
+        chapter_dir = self._register_chapter(chapter, pages, **kwargs)
 
-    def _download_pages(self, pages: List[str], download_dir: str, session=create_session(), **kwargs):
         for page in pages:
-            self._download(page, download_dir, session=session)
+            jobs.put((chapter, chapter_dir, page))
+
+    def _reset_progress(self, **kwargs):
+        self._pages_left = {}
+        self._pages_failed = {}
+        self._writers = {}
+        self._memory_pages = {}
+        self._total_pages = 0
+        self._chapters_done = 0
+        self._lock = threading.Lock()
+
+        if "bar" in kwargs:
+            kwargs["bar"].suffix = f"0 of {len(self.chapters)} chapter(s) done. Estimated time left: %(eta)ds"
+
+    def _chapter_dir(self, chapter: Chapter) -> str:
+        return path.join(self.comic_dirs[chapter.comic], clean_filename(chapter.title))
+
+    def _register_chapter(self, chapter: Chapter, pages: List[str], failed: bool = False, **kwargs) -> str:
+        chapter_dir = self._chapter_dir(chapter)
+
+        if self.streaming:
+            if len(pages) > 0:
+                self._writers[chapter] = CBZWriter(self._chapter_archive_path(chapter), order=[
+                    path.basename(self._page_path(page, chapter_dir)) for page in pages])
+        elif self.in_memory:
+            self._memory_pages[chapter] = {}
+        elif not failed:
+            self.logger.debug("Trying to create folders: %s", chapter_dir)
+            create_folders(chapter_dir)
+
+        self.metrics.chapter_started(chapter.link, chapter.title, len(pages))
+        self.tracer.begin("chapter", CHAPTER, chapter,
+                          title=chapter.title, pages=len(pages))
+
+        with self._lock:
+            self._pages_left[chapter] = len(pages)
+            self._pages_failed[chapter] = 1 if failed else 0
+            self._total_pages += len(pages)
+
+            if len(pages) == 0:
+                self._chapter_done(chapter, **kwargs)
+
+            if "bar" in kwargs and self._total_pages > 0:
+                kwargs["bar"].max = self._total_pages
+
+        if len(pages) == 0:
+            self._stage_chapter(chapter)
+
+        return chapter_dir
+
+    def _page_done(self, chapter: Chapter, failed: bool = False, **kwargs):
+        with self._lock:
+            self._pages_left[chapter] -= 1
+
+            if failed:
+                self._pages_failed[chapter] += 1
+
+            done = self._pages_left[chapter] == 0
+            if done:
+                self._chapter_done(chapter, **kwargs)
 
             if "bar" in kwargs:
                 kwargs["bar"].next()
 
-    def _download(self, page: str, download_dir: str, session=create_session()):
+        # Outside the lock, this blocks while the stages are busy.
+        if done:
+            self._stage_chapter(chapter)
+
+    def _chapter_done(self, chapter: Chapter, **kwargs):
+        self._chapters_done += 1
+        self.metrics.chapter_finished(
+            chapter.link, self._pages_failed[chapter])
+        self.tracer.end("chapter", CHAPTER, chapter,
+                        failed_pages=self._pages_failed[chapter])
+
+        if self._pages_failed[chapter] == 0:
+            self.completed_chapters.append(chapter)
+        else:
+            self.failed_chapters.append(chapter)
+
+        if not self._has_conversion():
+            self._gate.release(chapter)
+
+        writer = self._writers.pop(chapter, None)
+        if writer is not None:
+            complete = self._pages_failed[chapter] == 0
+            writer.close(complete=complete)
+
+            if not complete:
+                self.logger.error(
+                    f"{chapter.title} has missing pages, its archive was left at {writer.part_path}")
+
+        if "bar" in kwargs:
+            kwargs["bar"].suffix = f"{self._chapters_done} of {len(self.chapters)} chapter(s) done. Estimated time left: %(eta)ds"
+
+    def _download_worker(self, jobs: queue.Queue, **kwargs):
+        if self.session_policy == SHARED:
+            session = self._session
+        else:
+            # A worker only ever has one request in flight.
+            session = create_session(pool_size=1)
+
+        while True:
+            job = jobs.get()
+
+            if job is None:
+                break
+
+            chapter, chapter_dir, page = job
+            failed = False
+
+            if self.limiter is not None:
+                self.limiter.acquire()
+
+            try:
+                self._download(chapter, page, chapter_dir, session=session)
+            except Exception as e:
+                self.logger.exception(f"Failed to download {page}.")
+                self.metrics.record_error(page, e)
+                failed = True
+            finally:
+                if self.limiter is not None:
+                    self.limiter.release()
+
+            self._page_done(chapter, failed=failed, **kwargs)
+
+    def _start_pipeline(self):
+        self._stages = []
+        self._comic_writers = {}
+        self._merge_order = {comic: [chapter for chapter in self.chapters if chapter.comic is comic]
+                             for comic in self.comics}
+        self._merge_ready = {comic: {} for comic in self.comics}
+        self._packed_dirs = {comic: [] for comic in self.comics}
+        self._gate = StagingGate(self.staging_limit, self.staging_quota)
+
+        if self.verify and self._stages_on_disk():
+            # Pages kept off the disk are checked as they arrive, see _check_body.
+            self._stages.append(Stage(self._verify_chapter, maxsize=self.max_staged_chapters,
+                                      name="verification", daemon=self.daemon))
+
+        if self._has_conversion():
+            workers = 1
+
+            if self._uses_processes():
+                self._converter = ProcessPoolExecutor(
+                    max_workers=self.conversion_processes)
+
+            if self._converts_chapters():
+                workers = self.conversion_processes or os.cpu_count() or 1
+
+            self.logger.info(f"Converting into {self.output_format} format.")
+            self._stages.append(Stage(self._convert_chapter, maxsize=self.max_staged_chapters,
+                                      workers=workers, name="conversion", daemon=self.daemon))
+
+        for stage in self._stages:
+            stage.start()
+
+    def _stage_chapter(self, chapter: Chapter, index: int = 0):
+        if index < len(self._stages):
+            self._stages[index].put(chapter)
+
+    def _finish_pipeline(self):
+        for stage in self._stages:
+            stage.close()
+
+        if self._uses_processes():
+            self._converter.shutdown()
+
+        for comic, writer in self._comic_writers.items():
+            writer.close()
+
+            # Packed pages are the only complete copy until the archive is
+            # renamed. If a chapter failed they are also kept, so the next run
+            # rebuilds the whole archive instead of one holding only that chapter.
+            if not any(chapter.comic is comic for chapter in self.failed_chapters):
+                for chapter_dir in self._packed_dirs[comic]:
+                    delete_folders(chapter_dir)
+
+            comic_dir = self.comic_dirs[comic]
+
+            # Failed chapters stay behind for the next run.
+            if not any(path.isdir(path.join(comic_dir, d)) for d in listdir(comic_dir)):
+                delete_folders(comic_dir)
+
+    def _abort_pipeline(self):
+        # Chapters already staged are still handled, the archives are left
+        # unfinished and their pages kept for the next run.
+        for stage in self._stages:
+            stage.close()
+
+        if self._uses_processes():
+            self._converter.shutdown()
+
+        for writer in list(self._comic_writers.values()) + list(self._writers.values()):
+            writer.close(complete=False)
+
+    def _is_chapter_ok(self, chapter: Chapter) -> bool:
+        with self._lock:
+            return self._pages_failed[chapter] == 0
+
+    def _verify_chapter(self, chapter: Chapter):
+        with self.tracer.span("verify", CONVERT, title=chapter.title):
+            self._verify_staged_chapter(chapter)
+
+        self._stage_chapter(chapter, index=1)
+
+    def _verify_staged_chapter(self, chapter: Chapter):
+        chapter_dir = self._chapter_dir(chapter)
+        manifest = self.manifests[chapter.comic]
+
+        if self._is_chapter_ok(chapter) and path.isdir(chapter_dir):
+            bad_pages = 0
+
+            for page in chapter.pages:
+                page_path = self._page_path(page, chapter_dir)
+                record = manifest.get(page_path) or {}
+
+                try:
+                    verify_image_file(
+                        page_path, expected_size=record.get("content_length"))
+                except (OSError, VerificationError) as e:
+                    self.logger.error(f"{page} failed verification: {e}")
+                    self.metrics.record_error(page, e)
+                    bad_pages += 1
+
+                    # Deleted so the next run downloads it again.
+                    if path.isfile(page_path):
+                        os.remove(page_path)
+
+            if bad_pages > 0:
+                self._fail_chapter(chapter, bad_pages)
+
+    def _fail_chapter(self, chapter: Chapter, failed_pages: int = 0):
+        with self._lock:
+            self._pages_failed[chapter] += failed_pages
+
+            if chapter in self.completed_chapters:
+                self.completed_chapters.remove(chapter)
+                self.failed_chapters.append(chapter)
+
+    def _convert_chapter(self, chapter: Chapter):
+        try:
+            with self.tracer.span("convert", CONVERT, title=chapter.title):
+                self._convert_staged_chapter(chapter)
+        except Exception:
+            self.logger.exception(f"Failed to convert {chapter.title}.")
+            self._fail_chapter(chapter)
+        finally:
+            # Merged chapters waiting for an earlier one are released too,
+            # holding them back could wait on a chapter never admitted.
+            self._gate.release(chapter)
+
+    def _convert_staged_chapter(self, chapter: Chapter):
+        chapter_dir = self._chapter_dir(chapter)
+        ok = self._is_chapter_ok(chapter) and (
+            self.in_memory or path.isdir(chapter_dir))
+
+        if ok and self.transform is not None:
+            try:
+                with self.tracer.span("transform", CONVERT, title=chapter.title):
+                    results = transform_images(self.transform, get_images(
+                        chapter_dir), executor=self._converter)
+            except Exception:
+                self.logger.exception(f"Failed to transform {chapter.title}.")
+                results = []
+
+            for _, before, after, seconds in results:
+                self.metrics.record_transform(before, after, seconds)
+
+        if self._converts_chapters():
+            # Chapters skipped on resume might have been converted already.
+            if ok and len(get_images(chapter_dir)) > 0:
+                self._converter.submit(chapter_to_PDF, chapter_dir).result()
+        elif self.merge_pdf:
+            self._merge_chapter(chapter, ok)
+        elif self.in_memory:
+            pages = self._memory_pages.pop(chapter, {})
+
+            if ok:
+                writer = self._comic_writer(chapter.comic, f".{CBZ}")
+                rel_root = path.dirname(self.comic_dirs[chapter.comic])
+
+                for page in chapter.pages:
+                    page_path = self._page_path(page, chapter_dir)
+                    writer.add(path.relpath(page_path, rel_root),
+                               pages[page_path])
+        elif self.output_format == CBZ and ok:
+            comic_dir = self.comic_dirs[chapter.comic]
+            writer = self._comic_writer(chapter.comic, f".{CBZ}")
+            rel_root = path.dirname(comic_dir)
+
+            for image in get_images(chapter_dir):
+                writer.add_file(image, path.relpath(image, rel_root))
+
+            self._packed_dirs[chapter.comic].append(chapter_dir)
+
+    def _comic_writer(self, comic: Comic, extension: str):
+        if comic not in self._comic_writers:
+            output = self.comic_dirs[comic] + extension
+            self._comic_writers[comic] = PDFWriter(
+                output) if extension == f".{PDF}" else CBZWriter(output)
+
+        return self._comic_writers[comic]
+
+    def _merge_chapter(self, chapter: Chapter, ok: bool):
+        # Chapters finish in any order, the PDF takes them in reading order.
+        order = self._merge_order[chapter.comic]
+        ready = self._merge_ready[chapter.comic]
+        ready[chapter] = ok
+
+        while len(order) > 0 and order[0] in ready:
+            chapter = order.pop(0)
+
+            if not ready.pop(chapter):
+                continue
+
+            chapter_dir = self._chapter_dir(chapter)
+            writer = self._comic_writer(chapter.comic, f".{PDF}")
+
+            # Chapters after a broken one are still merged, the broken one
+            # is checked before any of its pages is written.
+            try:
+                writer.add_images(get_images(chapter_dir))
+            except Exception:
+                self.logger.exception(f"Failed to merge {chapter.title}.")
+                self._fail_chapter(chapter)
+
+            self._packed_dirs[chapter.comic].append(chapter_dir)
+
+    def _page_path(self, page: str, download_dir: str) -> str:
         filename = clean_filename(page[page.rfind("/") + 1:])
-        page_path = path.join(download_dir, filename)
+        return path.join(download_dir, filename)
+
+    def _chapter_archive_path(self, chapter: Chapter) -> str:
+        return self._chapter_dir(chapter) + f".{CBZ}"
+
+    def _is_chapter_complete(self, chapter: Chapter) -> bool:
+        if not self.resume:
+            return False
+
+        if self.streaming:
+            return path.isfile(self._chapter_archive_path(chapter))
+
+        if self._converts_chapters():
+            return path.isfile(self._chapter_dir(chapter) + f".{PDF}")
+
+        return False
+
+    def _is_page_complete(self, chapter: Chapter, page_path: str) -> bool:
+        return self._stages_on_disk() and self.resume and self.manifests[chapter.comic].is_complete(page_path)
+
+    def _from_store(self, chapter: Chapter, page: str, page_path: str) -> bool:
+        if self.store is None:
+            return False
+
+        blob = self.store.lookup(page)
+
+        if blob is None:
+            return False
+
+        sha256, size = blob
+
+        with self.tracer.span("link", DISK, url=page):
+            if self.streaming:
+                self._writers[chapter].add(
+                    path.basename(page_path), self.store.read(sha256))
+            elif self.in_memory:
+                self._memory_pages[chapter][page_path] = self.store.read(
+                    sha256)
+            else:
+                self.store.link(sha256, page_path)
+            self.manifests[chapter.comic].add(page_path, page, size, sha256)
+
+        self.logger.debug("Linked %s from the store.", page)
+        self.metrics.record_page(page, 0, skipped=True)
+        return True
+
+    def _save_page(self, chapter: Chapter, page: str, page_path: str, data: bytes, etag: str = None,
+                   content_length: int = None):
+        sha256 = None
+        if self.store is not None or self._stages_on_disk():
+            sha256 = hashlib.sha256(data).hexdigest()
+
+        with self.tracer.span("write", DISK, url=page, size=len(data)):
+            if self.streaming:
+                self._writers[chapter].add(path.basename(page_path), data)
+            elif self.in_memory:
+                self._memory_pages[chapter][page_path] = data
+            else:
+                part_path = page_path + PART_SUFFIX
+
+                with open(part_path, "wb") as f:
+                    f.write(data)
+
+                os.replace(part_path, page_path)
+                self.manifests[chapter.comic].add(page_path, page, len(data),
+                                                  sha256, etag, content_length)
+
+        if self.store is not None:
+            self.store.add(page, data, sha256, etag)
+
+        self.metrics.record_page(page, len(data))
+
+    def _download(self, chapter: Chapter, page: str, download_dir: str, session: requests.Session):
+        page_path = self._page_path(page, download_dir)
+
+        if self._is_page_complete(chapter, page_path):
+            self.logger.debug("Skipping %s, already downloaded.", page)
+            self.metrics.record_page(page, 0, skipped=True)
+            return
+
+        if self._from_store(chapter, page, page_path):
+            return
+
+        # A body that is cut short or not an image is fetched again by the
+        # fetcher, from the same retry budget as failed requests.
+        if self._stages_on_disk():
+            self._write_page(chapter, page, page_path, session)
+        else:
+            data, headers = self.fetcher.get(session, page, metrics=self.metrics,
+                                             check=lambda r: self._check_body(page, r.content, r.headers))
+            self._save_page(chapter, page, page_path, data,
+                            headers.get("ETag"), get_content_length(headers))
+
+    def _check_page(self, page: str, head: bytes, tail: bytes, size: int, content_length: int = None):
+        if content_length is not None and size != content_length:
+            raise VerificationError(
+                f"{page} is {size} bytes, expected {content_length}.")
+
+        if self.verify:
+            verify_image_data(head, tail, name=page)
+        else:
+            check_image_signature(head, name=page)
+
+    def _check_body(self, page: str, data: bytes, headers) -> tuple:
+        self._check_page(page, data[:HEAD_SIZE], data[-TAIL_SIZE:],
+                         len(data), get_content_length(headers))
+
+        return data, headers
+
+    def _write_page(self, chapter: Chapter, page: str, page_path: str, session: requests.Session):
+        # Pages only get their final name once complete, a crash leaves a
+        # .part file behind that the next run overwrites.
+        part_path = page_path + PART_SUFFIX
+
+        def write(r: requests.Response) -> tuple:
+            digest = hashlib.sha256()
+            size = 0
+            head = b""
+            tail = b""
+            content_length = get_content_length(r.headers)
+
+            # The body streams in while it is written, the span covers both.
+            with r, self.tracer.span("write", DISK, url=page), open(part_path, "wb") as f:
+                preallocate(f, content_length)
+
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+
+                    if len(head) < HEAD_SIZE:
+                        head += chunk[:HEAD_SIZE - len(head)]
+
+                    tail = chunk[-TAIL_SIZE:] if len(
+                        chunk) >= TAIL_SIZE else (tail + chunk)[-TAIL_SIZE:]
+
+                # Drops whatever was preallocated and not written.
+                f.truncate()
+
+            try:
+                self._check_page(page, head, tail, size, content_length)
+            except VerificationError:
+                os.remove(part_path)
+                raise
+
+            return size, digest.hexdigest(), r.headers.get("ETag"), content_length
+
+        size, sha256, etag, content_length = self.fetcher.get(session, page, stream=True, metrics=self.metrics,
+                                                              check=write)
+
+        os.replace(part_path, page_path)
+        self.manifests[chapter.comic].add(page_path, page, size, sha256,
+                                          etag, content_length)
 
-        r = session.get(page, stream=True)
+        if self.store is not None:
+            self.store.add_file(page, page_path, sha256, size, etag)
 
-        with open(page_path, "wb") as f:
-            for chunk in r:
-                f.write(chunk)
+        self.metrics.record_page(page, size)
@@ -0,0 +1,287 @@
+from urllib.parse import urlparse
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from .exceptions import FetchError, VerificationError
+from .Tracing import NULL_TRACER, FETCH
+
+# (connect, read) in seconds
+DEFAULT_TIMEOUT = (10, 30)
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+# Lost connections, timeouts and bodies cut short while being read.
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        """Token bucket rate limiter, safe to share between threads.
+
+        Arguments:
+            rate {float} -- Tokens added per second
+
+        Keyword Arguments:
+            burst {int} -- Maximum number of tokens (default: {1})
+        """
+
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token, going into debt if there is none.
+
+        Returns:
+            float -- Seconds to wait before the token may be used
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens +
+                              (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+
+            if self.tokens >= 0:
+                return 0
+
+            return -self.tokens / self.rate
+
+
+class Fetcher:
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries: int = 3, backoff_factor: float = 0.5, max_backoff: float = 30,
+                 rate_limit: float = None, burst: int = 1, tracer=None):
+        """HTTP fetch layer with timeouts, retries and a per host rate limit.
+
+        Failed requests are retried with exponential backoff and full jitter,
+        Retry-After headers are honored. One {Fetcher} is meant to be shared
+        by every worker so the rate limit holds across all of them.
+
+        Keyword Arguments:
+            timeout {float|tuple} -- Requests timeout, (connect, read) in seconds (default: {(10, 30)})
+            retries {int} -- Retries after the first attempt (default: {3})
+            backoff_factor {float} -- Base of the backoff, the nth retry waits up to backoff_factor * 2^n seconds (default: {0.5})
+            max_backoff {float} -- Cap of a single backoff in seconds (default: {30})
+            rate_limit {float} -- Requests per second per host, None to disable (default: {None})
+            burst {int} -- Requests per host allowed in a burst above the rate limit (default: {1})
+            tracer {Tracer} -- Times every request, retries included (default: {NullTracer()})
+        """
+
+        self.timeout = timeout
+        self.retries = max(retries, 0)
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.tracer = tracer if tracer is not None else NULL_TRACER
+
+        self.logger = logging.getLogger(__name__)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def get(self, session: requests.Session, url: str, metrics=None, check=None, **kwargs) -> requests.Response:
+        return self.request(session, "GET", url, metrics=metrics, check=check, **kwargs)
+
+    def head(self, session: requests.Session, url: str, metrics=None, **kwargs) -> requests.Response:
+        return self.request(session, "HEAD", url, metrics=metrics, **kwargs)
+
+    def request(self, session: requests.Session, method: str, url: str, metrics=None, check=None,
+                **kwargs) -> requests.Response:
+        """Sends a request, retrying connection errors, timeouts, bodies cut short and retryable statuses.
+
+        Arguments:
+            session {requests.Session} -- Session to use
+            method {str} -- HTTP method
+            url {str} -- Url
+
+        Keyword Arguments:
+            metrics {Metrics} -- Records the latency of every attempt and the retries (default: {None})
+            check {callable} -- Reads a successful response and returns the result, a {VerificationError} or a
+                                broken body retries the request from the same budget (default: {None})
+
+        Raises:
+            FetchError: Non retryable status or retries exhausted
+
+        Returns:
+            requests.Response -- Successful response, or what check returned
+        """
+
+        kwargs.setdefault("timeout", self.timeout)
+
+        with self.tracer.span(method, FETCH, url=url):
+            return self._request(session, method, url, metrics, check, **kwargs)
+
+    def _request(self, session: requests.Session, method: str, url: str, metrics=None, check=None,
+                 **kwargs) -> requests.Response:
+        for attempt in range(self.retries + 1):
+            time.sleep(self._throttle(url))
+
+            retry_after = None
+            started_at = time.monotonic()
+            try:
+                res = session.request(method, url, **kwargs)
+            except RETRY_ERRORS as e:
+                error = e
+                self._record(metrics, url, started_at)
+            else:
+                self._record(metrics, url, started_at, res.status_code)
+
+                if res.status_code < 400:
+                    if check is None:
+                        return res
+
+                    try:
+                        return check(res)
+                    except (VerificationError, requests.RequestException) as e:
+                        error = e
+                        res.close()
+                else:
+                    error = FetchError(
+                        f"{url} returned {res.status_code}.", status=res.status_code)
+                    retry_after = self._retry_after(res.headers)
+                    res.close()
+
+                    if res.status_code not in RETRY_STATUSES:
+                        raise error
+
+            delay = self._retry_delay(url, attempt, error, retry_after, metrics)
+            time.sleep(delay)
+
+    async def aread(self, session, url: str, metrics=None, check=None, **kwargs):
+        """Async counterpart of {Fetcher.get} for aiohttp sessions, reads the whole body.
+
+        Arguments:
+            session {aiohttp.ClientSession} -- Session to use
+            url {str} -- Url
+
+        Keyword Arguments:
+            metrics {Metrics} -- Records the latency of every attempt and the retries (default: {None})
+            check {callable} -- Takes the body and the response and returns the result, a {VerificationError}
+                                retries the request from the same budget (default: {None})
+            **kwargs -- Passed to session.get, e.g. headers
+
+        Raises:
+            FetchError: Non retryable status or retries exhausted
+
+        Returns:
+            tuple -- (body, headers) of the successful response, or what check returned
+        """
+
+        import aiohttp
+
+        # Coroutines share the loop's thread, each gets its own track.
+        with self.tracer.span("GET", FETCH, tid=id(asyncio.current_task()), url=url):
+            return await self._aread(aiohttp, session, url, metrics, check, **kwargs)
+
+    def trace_config(self, aiohttp):
+        """Marks when each aiohttp request gets its connection, pass it to the session's trace_configs
+        so {Fetcher.aread} leaves the wait for a connector slot out of the latency.
+
+        Arguments:
+            aiohttp {module} -- aiohttp, imported by the caller
+
+        Returns:
+            aiohttp.TraceConfig -- Trace config for the session
+        """
+
+        async def on_connected(session, trace_config_ctx, params):
+            if trace_config_ctx.trace_request_ctx is not None:
+                trace_config_ctx.trace_request_ctx["connected_at"] = time.monotonic()
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connected)
+        trace_config.on_connection_reuseconn.append(on_connected)
+
+        return trace_config
+
+    async def _aread(self, aiohttp, session, url: str, metrics=None, check=None, **kwargs):
+        connect, read = self.timeout if isinstance(
+            self.timeout, tuple) else (self.timeout, self.timeout)
+        timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+        for attempt in range(self.retries + 1):
+            await asyncio.sleep(self._throttle(url))
+
+            retry_after = None
+            # Filled in by the trace config once the connection is acquired.
+            timing = {}
+            queued_at = time.monotonic()
+            try:
+                async with session.get(url, timeout=timeout, trace_request_ctx=timing, **kwargs) as res:
+                    started_at = timing.get("connected_at", queued_at)
+
+                    if res.status < 400:
+                        body = await res.read()
+                        self._record(metrics, url, started_at, res.status)
+
+                        if check is None:
+                            return body, res.headers
+
+                        return check(body, res)
+
+                    self._record(metrics, url, started_at, res.status)
+
+                    error = FetchError(
+                        f"{url} returned {res.status}.", status=res.status)
+                    retry_after = self._retry_after(res.headers)
+
+                    if res.status not in RETRY_STATUSES:
+                        raise error
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+                self._record(metrics, url, timing.get("connected_at", queued_at))
+            except VerificationError as e:
+                error = e
+
+            await asyncio.sleep(self._retry_delay(url, attempt, error, retry_after, metrics))
+
+    def _throttle(self, url: str) -> float:
+        if self.rate_limit is None:
+            return 0
+
+        host = urlparse(url).netloc
+
+        with self._lock:
+            bucket = self._buckets.get(host)
+
+            if bucket is None:
+                bucket = TokenBucket(self.rate_limit, self.burst)
+                self._buckets[host] = bucket
+
+        return bucket.reserve()
+
+    def _record(self, metrics, url: str, started_at: float, status: int = None):
+        if metrics is not None:
+            metrics.record_request(url, time.monotonic() - started_at, status)
+
+    def _retry_delay(self, url: str, attempt: int, error: Exception, retry_after: float = None, metrics=None) -> float:
+        if attempt >= self.retries:
+            raise FetchError(
+                f"Giving up on {url} after {attempt + 1} attempt(s).") from error
+
+        delay = random.uniform(0, min(self.max_backoff,
+                                      self.backoff_factor * 2 ** attempt))
+
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+
+        self.logger.warning(
+            f"{error} Retrying {url} in {delay:.2f}s ({attempt + 1} of {self.retries}).")
+
+        if metrics is not None:
+            metrics.record_retry(url, error, delay)
+
+        return delay
+
+    def _retry_after(self, headers) -> float:
+        try:
+            return float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,84 @@
+import json
+import os
+from os import path
+from typing import List
+
+from .objects import Comic, Chapter
+from .util import create_folders
+
+CONFIG_DIR = path.join(path.expanduser("~"), ".comickaze")
+DEFAULT_LIBRARY_PATH = path.join(CONFIG_DIR, "library.json")
+DEFAULT_CACHE_DIR = path.join(CONFIG_DIR, "cache")
+DEFAULT_CATALOG_DIR = CONFIG_DIR
+
+
+class Library:
+    def __init__(self, library_path: str = DEFAULT_LIBRARY_PATH):
+        """Local index of followed comics and the chapters already downloaded.
+
+        Keyword Arguments:
+            library_path {str} -- Path of the library file (default: {"~/.comickaze/library.json"})
+        """
+
+        self.library_path = library_path
+        self.comics = {}
+
+        if path.isfile(library_path):
+            with open(library_path, "r", encoding="utf-8") as f:
+                self.comics = json.load(f)["comics"]
+
+    def save(self):
+        create_folders(path.dirname(path.abspath(self.library_path)))
+
+        part_path = self.library_path + ".part"
+        with open(part_path, "w", encoding="utf-8") as f:
+            json.dump({"comics": self.comics}, f, indent=2)
+
+        os.replace(part_path, self.library_path)
+
+    def follow(self, comic: Comic, mark_downloaded: bool = False):
+        """Adds a comic to the library.
+
+        Arguments:
+            comic {Comic} -- Comic to follow
+
+        Keyword Arguments:
+            mark_downloaded {bool} -- Treat the comic's current chapters as downloaded, only later ones get synced (default: {False})
+        """
+
+        entry = self.comics.setdefault(comic.link, {
+            "title": comic.title,
+            "link": comic.link,
+            "chapters": []
+        })
+
+        if mark_downloaded:
+            self.mark_downloaded(comic.chapters or [])
+
+        return entry
+
+    def unfollow(self, link: str) -> bool:
+        return self.comics.pop(link, None) is not None
+
+    def is_followed(self, link: str) -> bool:
+        return link in self.comics
+
+    def new_chapters(self, comic: Comic) -> List[Chapter]:
+        """Gets the chapters of a followed comic that were not downloaded yet.
+
+        Arguments:
+            comic {Comic} -- Freshly fetched comic
+
+        Returns:
+            List[Chapter] -- New chapters in the comic's order
+        """
+
+        downloaded = set(self.comics[comic.link]["chapters"])
+        return [chapter for chapter in comic.chapters or [] if chapter.link not in downloaded]
+
+    def mark_downloaded(self, chapters: List[Chapter]):
+        for chapter in chapters:
+            entry = self.comics.get(chapter.comic.link)
+
+            if entry is not None and chapter.link not in entry["chapters"]:
+                entry["chapters"].append(chapter.link)
@@ -0,0 +1,90 @@
+import json
+import threading
+from os import path
+
+MANIFEST_FILENAME = ".comickaze-manifest"
+PART_SUFFIX = ".part"
+
+
+class Manifest:
+    def __init__(self, comic_dir: str):
+        """Record of the pages completely downloaded into a comic directory.
+
+        The manifest is an append-only file of JSON lines, one per completed
+        page, so a crash can at worst lose the last, partially written line.
+
+        Arguments:
+            comic_dir {str} -- Comic directory
+        """
+
+        self.comic_dir = comic_dir
+        self.manifest_path = path.join(comic_dir, MANIFEST_FILENAME)
+        self.pages = {}
+        self._lock = threading.Lock()
+
+        self._load()
+
+    def _load(self):
+        if not path.isfile(self.manifest_path):
+            return
+
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+
+                self.pages[record["path"]] = record
+
+    def _key(self, page_path: str) -> str:
+        return path.relpath(page_path, self.comic_dir).replace(path.sep, "/")
+
+    def is_complete(self, page_path: str) -> bool:
+        """Checks if a page was recorded as complete and is still intact on disk.
+
+        Arguments:
+            page_path {str} -- Path of the page
+
+        Returns:
+            bool -- True if the page does not need to be downloaded again
+        """
+
+        record = self.pages.get(self._key(page_path))
+
+        if record is None or not path.isfile(page_path):
+            return False
+
+        return path.getsize(page_path) == record["size"]
+
+    def get(self, page_path: str) -> dict:
+        return self.pages.get(self._key(page_path))
+
+    def add(self, page_path: str, url: str, size: int, sha256: str, etag: str = None, content_length: int = None):
+        """Records a completed page. Call only once the page is at its final path.
+
+        Arguments:
+            page_path {str} -- Path of the page
+            url {str} -- Url the page was downloaded from
+            size {int} -- Size in bytes
+            sha256 {str} -- Hex digest of the content
+
+        Keyword Arguments:
+            etag {str} -- ETag header of the response (default: {None})
+            content_length {int} -- Content-Length header of the response (default: {None})
+        """
+
+        record = {
+            "path": self._key(page_path),
+            "url": url,
+            "size": size,
+            "sha256": sha256,
+            "etag": etag,
+            "content_length": content_length
+        }
+
+        with self._lock:
+            self.pages[record["path"]] = record
+
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
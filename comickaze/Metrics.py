@@ -0,0 +1,211 @@
+from collections import defaultdict
+import json
+import threading
+import time
+
+REQUEST = "request"
+RETRY = "retry"
+PAGE = "page"
+CHAPTER = "chapter"
+ERROR = "error"
+
+# Upper bounds in seconds, the last bucket catches everything slower.
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+class Metrics:
+    def __init__(self):
+        """Thread-safe counters, latency histogram and per chapter timings of a download run.
+
+        Callbacks registered with {Metrics.on} get every event as it happens,
+        {Metrics.report} sums the whole run up.
+        """
+
+        self._lock = threading.Lock()
+        self._callbacks = defaultdict(list)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = None
+            self.finished_at = None
+            self.requests = 0
+            self.retries = 0
+            self.errors = 0
+            self.pages = 0
+            self.skipped_pages = 0
+            self.bytes = 0
+            self.latency_sum = 0
+            self.latency_histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+            self.status_codes = defaultdict(int)
+            self.chapters = {}
+            self.transformed_pages = 0
+            self.transform_bytes_before = 0
+            self.transform_bytes_after = 0
+            self.transform_seconds = 0
+
+    def on(self, event: str, callback):
+        """Registers a callback, called as callback(event, data) from whichever thread recorded the event.
+
+        Arguments:
+            event {str} -- One of "request", "retry", "page", "chapter" or "error"
+            callback {callable} -- Callback
+        """
+
+        self._callbacks[event].append(callback)
+
+    def _emit(self, event: str, **data):
+        for callback in self._callbacks[event]:
+            callback(event, data)
+
+    def start(self):
+        self.reset()
+        self.started_at = time.time()
+
+    def finish(self):
+        self.finished_at = time.time()
+
+    def record_request(self, url: str, latency: float, status: int = None):
+        with self._lock:
+            self.requests += 1
+            self.latency_sum += latency
+            self.status_codes[status] += 1
+
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    self.latency_histogram[i] += 1
+                    break
+            else:
+                self.latency_histogram[-1] += 1
+
+        self._emit(REQUEST, url=url, latency=latency, status=status)
+
+    def record_retry(self, url: str, error: Exception, delay: float):
+        with self._lock:
+            self.retries += 1
+
+        self._emit(RETRY, url=url, error=str(error), delay=delay)
+
+    def record_error(self, url: str, error: Exception):
+        with self._lock:
+            self.errors += 1
+
+        self._emit(ERROR, url=url, error=str(error))
+
+    def record_page(self, url: str, size: int, skipped: bool = False):
+        with self._lock:
+            if skipped:
+                self.skipped_pages += 1
+            else:
+                self.pages += 1
+                self.bytes += size
+
+        self._emit(PAGE, url=url, size=size, skipped=skipped)
+
+    def record_transform(self, before: int, after: int, seconds: float):
+        with self._lock:
+            self.transformed_pages += 1
+            self.transform_bytes_before += before
+            self.transform_bytes_after += after
+            self.transform_seconds += seconds
+
+    def chapter_started(self, link: str, title: str, pages: int):
+        with self._lock:
+            self.chapters[link] = {
+                "title": title,
+                "pages": pages,
+                "started_at": time.time(),
+                "finished_at": None,
+                "failed_pages": 0
+            }
+
+    def chapter_finished(self, link: str, failed_pages: int = 0):
+        with self._lock:
+            chapter = self.chapters[link]
+            chapter["finished_at"] = time.time()
+            chapter["failed_pages"] = failed_pages
+            chapter = dict(chapter)
+
+        self._emit(CHAPTER, link=link, **chapter)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0
+
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.elapsed if self.elapsed > 0 else 0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0
+
+    def latency_percentile(self, q: float) -> float:
+        """Estimates a latency percentile from the histogram.
+
+        Arguments:
+            q {float} -- Percentile between 0 and 1
+
+        Returns:
+            float -- Upper bound of the bucket holding the percentile, None if nothing was recorded
+        """
+
+        with self._lock:
+            histogram = list(self.latency_histogram)
+
+        total = sum(histogram)
+        if total == 0:
+            return None
+
+        seen = 0
+        for i, count in enumerate(histogram):
+            seen += count
+
+            if seen >= q * total:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float("inf")
+
+    def report(self) -> dict:
+        with self._lock:
+            chapters = [dict(chapter, link=link, seconds=(chapter["finished_at"] or time.time()) - chapter["started_at"])
+                        for link, chapter in self.chapters.items()]
+            report = {
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed": self.elapsed,
+                "requests": self.requests,
+                "retries": self.retries,
+                "errors": self.errors,
+                "pages": self.pages,
+                "skipped_pages": self.skipped_pages,
+                "bytes": self.bytes,
+                "pages_per_second": self.pages_per_second,
+                "bytes_per_second": self.bytes_per_second,
+                "latency": {
+                    "mean": self.latency_sum / self.requests if self.requests else None,
+                    "buckets": LATENCY_BUCKETS + ["inf"],
+                    "histogram": list(self.latency_histogram)
+                },
+                "status_codes": {str(code): count for code, count in self.status_codes.items()},
+                "chapters": chapters,
+                "transform": {
+                    "pages": self.transformed_pages,
+                    "bytes_before": self.transform_bytes_before,
+                    "bytes_after": self.transform_bytes_after,
+                    "saved": 1 - self.transform_bytes_after / self.transform_bytes_before if self.transform_bytes_before else 0,
+                    "seconds": self.transform_seconds,
+                    "pages_per_core_second": self.transformed_pages / self.transform_seconds if self.transform_seconds else 0
+                }
+            }
+
+        report["latency"]["p50"] = self.latency_percentile(0.5)
+        report["latency"]["p95"] = self.latency_percentile(0.95)
+        report["latency"]["p99"] = self.latency_percentile(0.99)
+
+        return report
+
+    def export(self, report_path: str):
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
@@ -0,0 +1,280 @@
+import os
+import shutil
+import struct
+import zlib
+from os import path
+
+from .Manifest import PART_SUFFIX
+
+# Start of frame markers, they hold the dimensions of the image.
+SOF_MARKERS = [0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6,
+               0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF]
+COLOR_SPACES = {1: "/DeviceGray", 3: "/DeviceRGB", 4: "/DeviceCMYK"}
+DEFAULT_DPI = 96
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def read_jpeg_info(file_path):
+    """Reads the dimensions, components and resolution of a JPEG without decoding it.
+
+    Arguments:
+        file_path {str} -- Path of the JPEG
+
+    Raises:
+        ValueError: The file is not a JPEG
+
+    Returns:
+        tuple -- (width, height, components, (x_dpi, y_dpi), adobe)
+    """
+
+    dpi = (DEFAULT_DPI, DEFAULT_DPI)
+    adobe = False
+
+    with open(file_path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            raise ValueError(f"{file_path} is not a JPEG.")
+
+        while True:
+            marker = f.read(2)
+
+            if len(marker) < 2 or marker[0] != 0xFF:
+                raise ValueError(f"{file_path} is not a valid JPEG.")
+
+            # Fill bytes before a marker.
+            while marker[1] == 0xFF:
+                marker = marker[1:] + f.read(1)
+
+            length = struct.unpack(">H", f.read(2))[0]
+            segment = f.read(length - 2)
+
+            if marker[1] == 0xE0 and segment[:5] == b"JFIF\x00" and segment[7] in (1, 2):
+                x, y = struct.unpack(">HH", segment[8:12])
+                if x > 0 and y > 0:
+                    # Units of 2 are dots per centimeter.
+                    scale = 2.54 if segment[7] == 2 else 1
+                    dpi = (x * scale, y * scale)
+            elif marker[1] == 0xEE and segment[:5] == b"Adobe":
+                adobe = True
+            elif marker[1] in SOF_MARKERS:
+                height, width = struct.unpack(">HH", segment[1:5])
+                return width, height, segment[5], dpi, adobe
+
+
+def read_image_info(file_path):
+    """Checks that {PDFWriter} can embed an image, reading only its header.
+
+    Arguments:
+        file_path {str} -- Path of the image
+
+    Raises:
+        ValueError: The file is not an image or a JPEG with unsupported components
+
+    Returns:
+        tuple -- {read_jpeg_info} of a JPEG, None for the other image types
+    """
+
+    with open(file_path, "rb") as f:
+        jpeg = f.read(2) == b"\xff\xd8"
+
+    if jpeg:
+        info = read_jpeg_info(file_path)
+
+        if info[2] not in COLOR_SPACES:
+            raise ValueError(
+                f"{file_path} has an unsupported number of components: {info[2]}")
+
+        return info
+
+    # Pillow comes with img2pdf.
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(file_path):
+            return None
+    except UnidentifiedImageError:
+        raise ValueError(f"{file_path} is not an image.")
+
+
+class PDFWriter:
+    def __init__(self, output):
+        """PDF that pages are appended to one at a time.
+
+        Each JPEG is copied into the file in fixed size chunks and only the
+        object offsets are kept in memory, so memory stays flat no matter how
+        many pages are added. Other image types are decoded one at a time and
+        embedded losslessly. Written to output + ".part" until closed.
+
+        Arguments:
+            output {str} -- Path of the PDF
+        """
+
+        self.output = output
+        self.part_path = output + PART_SUFFIX
+        self._offsets = {}
+        self._pages = []
+        # 1 is the catalog, 2 the page tree, both are written on close.
+        self._next_id = 3
+
+        self._f = open(self.part_path, "wb")
+        self._f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(complete=exc_type is None)
+
+    def _new_id(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _begin(self, obj_id):
+        self._offsets[obj_id] = self._f.tell()
+        self._f.write(f"{obj_id} 0 obj\n".encode())
+
+    def _write_object(self, obj_id, body: str):
+        self._begin(obj_id)
+        self._f.write(body.encode() + b"\nendobj\n")
+
+    def add_image(self, file_path):
+        """Appends an image as a new page sized after its resolution.
+
+        Arguments:
+            file_path {str} -- Path of the image
+
+        Raises:
+            ValueError: The file is not an image the PDF can hold
+        """
+
+        self._add_image(file_path, read_image_info(file_path))
+
+    def add_images(self, file_paths):
+        """Appends images as new pages, all of them or none.
+
+        Every image is checked before the first one is written, so one that
+        cannot be embedded leaves the PDF as it was.
+
+        Arguments:
+            file_paths {list} -- Paths of the images, in page order
+
+        Raises:
+            ValueError: One of the files is not an image the PDF can hold
+        """
+
+        infos = [read_image_info(file_path) for file_path in file_paths]
+
+        for file_path, info in zip(file_paths, infos):
+            self._add_image(file_path, info)
+
+    def _add_image(self, file_path, info):
+        if info is None:
+            self._add_decoded_image(file_path)
+            return
+
+        width, height, components, dpi, adobe = info
+
+        # Adobe CMYK JPEGs are stored inverted.
+        decode = " /Decode [1 0 1 0 1 0 1 0]" if components == 4 and adobe else ""
+
+        def write_stream():
+            with open(file_path, "rb") as image:
+                shutil.copyfileobj(image, self._f, COPY_BUFFER_SIZE)
+
+        self._add_page(width, height, dpi, (f"/ColorSpace {COLOR_SPACES[components]} /BitsPerComponent 8{decode} "
+                                            f"/Filter /DCTDecode /Length {path.getsize(file_path)}"), write_stream)
+
+    def _add_decoded_image(self, file_path):
+        from PIL import Image
+
+        with Image.open(file_path) as image:
+            dpi = image.info.get("dpi", (DEFAULT_DPI, DEFAULT_DPI))
+
+            if image.mode in ("1", "L"):
+                pixels = image.convert("L")
+            else:
+                # Transparent areas are shown on white paper.
+                rgba = image.convert("RGBA")
+                pixels = Image.new("RGB", rgba.size, "white")
+                pixels.paste(rgba, mask=rgba.getchannel("A"))
+
+        width, height = pixels.size
+        color_space = COLOR_SPACES[1 if pixels.mode == "L" else 3]
+        data = zlib.compress(pixels.tobytes())
+
+        if not all(resolution > 0 for resolution in dpi):
+            dpi = (DEFAULT_DPI, DEFAULT_DPI)
+
+        self._add_page(width, height, dpi, (f"/ColorSpace {color_space} /BitsPerComponent 8 "
+                                            f"/Filter /FlateDecode /Length {len(data)}"), lambda: self._f.write(data))
+
+    def _add_page(self, width, height, dpi, image_entries: str, write_stream):
+        x_dpi, y_dpi = dpi
+
+        start, image_id = self._f.tell(), self._new_id()
+
+        try:
+            self._begin(image_id)
+            self._f.write((f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                           f"{image_entries} >>\nstream\n").encode())
+            write_stream()
+            self._f.write(b"\nendstream\nendobj\n")
+        except BaseException:
+            # Drop the half written image so the PDF is left as it was.
+            del self._offsets[image_id]
+            self._next_id = image_id
+            self._f.seek(start)
+            self._f.truncate()
+            raise
+
+        content_id = self._new_id()
+        page_id = self._new_id()
+
+        page_width = width * 72 / x_dpi
+        page_height = height * 72 / y_dpi
+
+        content = f"q {page_width:.4f} 0 0 {page_height:.4f} 0 0 cm /Im0 Do Q"
+        self._write_object(
+            content_id, f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+
+        self._write_object(page_id, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.4f} {page_height:.4f}] "
+                                     f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"))
+
+        self._pages.append(page_id)
+
+    def close(self, complete=True):
+        """Writes the page tree and the cross-reference table, then closes the file.
+
+        Keyword Arguments:
+            complete {bool} -- Move the PDF to its final path, otherwise the .part file is removed (default: {True})
+        """
+
+        if self._f.closed:
+            return
+
+        if not complete:
+            self._f.close()
+            os.remove(self.part_path)
+            return
+
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._pages)
+        self._write_object(
+            2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>")
+        self._write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self._f.tell()
+        size = self._next_id
+
+        self._f.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for obj_id in range(1, size):
+            if obj_id in self._offsets:
+                self._f.write(f"{self._offsets[obj_id]:010d} 00000 n \n".encode())
+            else:
+                # Allocated by a page that failed halfway, nothing refers to it.
+                self._f.write(b"0000000000 65535 f \n")
+
+        self._f.write((f"trailer\n<< /Size {size} /Root 1 0 R >>\n"
+                       f"startxref\n{xref_offset}\n%%EOF\n").encode())
+        self._f.close()
+
+        os.replace(self.part_path, self.output)
@@ -0,0 +1,221 @@
+import logging
+import os
+import queue
+import threading
+
+from .exceptions import VerificationError
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_IEND = b"IEND\xaeB`\x82"
+GIF_SIGNATURES = (b"GIF87a", b"GIF89a")
+
+# Bytes of an image needed to recognize its format.
+HEAD_SIZE = 16
+
+# Some encoders pad JPEGs after the end marker, look for it this far back.
+TAIL_SIZE = 32
+
+
+def get_content_length(headers) -> int:
+    """Gets the Content-Length of a response, if it describes the decoded body.
+
+    Arguments:
+        headers {dict} -- Response headers
+
+    Returns:
+        int -- Size of the body in bytes, None if unknown
+    """
+
+    if headers.get("Content-Encoding", "identity") != "identity":
+        return None
+
+    try:
+        return int(headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+
+
+def check_image_signature(head: bytes, name: str = "image"):
+    """Checks that data starts like a JPEG, PNG, GIF or WebP image, e.g. not an HTML error page.
+
+    Arguments:
+        head {bytes} -- First bytes of the data
+
+    Keyword Arguments:
+        name {str} -- Name of the image used in the error message (default: {"image"})
+
+    Raises:
+        VerificationError: The data is not an image
+    """
+
+    if head.startswith((JPEG_SOI, PNG_SIGNATURE) + GIF_SIGNATURES):
+        return
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return
+
+    raise VerificationError(f"{name} is not an image.")
+
+
+def verify_image_data(head: bytes, tail: bytes, name: str = "image"):
+    """Checks that an image starts with a JPEG or PNG signature and is not truncated.
+
+    Arguments:
+        head {bytes} -- First bytes of the image
+        tail {bytes} -- Last bytes of the image
+
+    Keyword Arguments:
+        name {str} -- Name of the image used in the error message (default: {"image"})
+
+    Raises:
+        VerificationError: The image is corrupt, truncated or not an image
+    """
+
+    if head.startswith(JPEG_SOI):
+        if JPEG_EOI not in tail:
+            raise VerificationError(f"{name} is a truncated JPEG.")
+    elif head.startswith(PNG_SIGNATURE):
+        if PNG_IEND not in tail:
+            raise VerificationError(f"{name} is a truncated PNG.")
+    else:
+        raise VerificationError(f"{name} is not a JPEG or PNG image.")
+
+
+def verify_image_file(file_path: str, expected_size: int = None):
+    """Checks an image on disk, see {verify_image_data}.
+
+    Arguments:
+        file_path {str} -- Path of the image
+
+    Keyword Arguments:
+        expected_size {int} -- Size announced by the server, None to skip the check (default: {None})
+
+    Raises:
+        VerificationError: The image is corrupt, truncated, not an image or not of the expected size
+    """
+
+    size = os.path.getsize(file_path)
+
+    if expected_size is not None and size != expected_size:
+        raise VerificationError(
+            f"{file_path} is {size} bytes, expected {expected_size}.")
+
+    with open(file_path, "rb") as f:
+        head = f.read(len(PNG_SIGNATURE))
+        f.seek(max(size - TAIL_SIZE, 0))
+        tail = f.read()
+
+    verify_image_data(head, tail, name=file_path)
+
+
+class Stage:
+    def __init__(self, handler, maxsize: int = 0, workers: int = 1, name: str = "stage", daemon: bool = True):
+        """Worker threads calling handler(item) on the items of a bounded queue.
+
+        {Stage.put} blocks while the queue is full, so a stage that falls
+        behind holds back whatever feeds it instead of letting work pile up.
+
+        Arguments:
+            handler {callable} -- Called with every item, exceptions are logged
+
+        Keyword Arguments:
+            maxsize {int} -- Items waiting in the queue at most, 0 for no limit (default: {0})
+            workers {int} -- Number of threads (default: {1})
+            name {str} -- Name used in log messages (default: {"stage"})
+            daemon {bool} -- Daemon value of the threads (default: {True})
+        """
+
+        self.handler = handler
+        self.name = name
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.logger = logging.getLogger(__name__)
+        self._threads = [threading.Thread(target=self._run, daemon=daemon)
+                         for _ in range(max(workers, 1))]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def close(self):
+        """Waits for every queued item to be handled and stops the threads."""
+
+        for _ in self._threads:
+            self.queue.put(None)
+
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+
+            if item is None:
+                break
+
+            try:
+                self.handler(item)
+            except Exception:
+                self.logger.exception(f"The {self.name} stage failed on {item}.")
+
+
+class StagingGate:
+    def __init__(self, max_chapters: int = None, quota: int = None):
+        """Limits the chapters, and their estimated bytes, staged on disk at the same time.
+
+        A chapter is admitted before its pages download and released once
+        it is converted, or once it is done when nothing converts it. A
+        chapter larger than the quota is still admitted when nothing else
+        is staged, so it cannot wait forever.
+
+        Keyword Arguments:
+            max_chapters {int} -- Chapters staged at most, None for no limit (default: {None})
+            quota {int} -- Estimated bytes staged at most, None for no limit (default: {None})
+        """
+
+        self.max_chapters = max_chapters
+        self.quota = quota
+        self.chapters = 0
+        self.bytes = 0
+        self._sizes = {}
+        self._condition = threading.Condition()
+
+    def _fits(self, size: int) -> bool:
+        if self.chapters == 0:
+            return True
+
+        if self.max_chapters is not None and self.chapters >= self.max_chapters:
+            return False
+
+        return self.quota is None or self.bytes + size <= self.quota
+
+    def acquire(self, key, size: int = 0):
+        """Blocks until the chapter fits.
+
+        Arguments:
+            key {object} -- Chapter being staged
+
+        Keyword Arguments:
+            size {int} -- Estimated size in bytes (default: {0})
+        """
+
+        with self._condition:
+            self._condition.wait_for(lambda: self._fits(size))
+            self._sizes[key] = size
+            self.chapters += 1
+            self.bytes += size
+
+    def release(self, key):
+        """Releases a chapter, chapters that were never admitted are ignored."""
+
+        with self._condition:
+            if key not in self._sizes:
+                return
+
+            self.chapters -= 1
+            self.bytes -= self._sizes.pop(key)
+            self._condition.notify_all()
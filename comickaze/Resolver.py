@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+import requests
+
+from .exceptions import FetchError
+from .Fetcher import Fetcher
+
+HTML = "html"
+PROBE = "probe"
+BINARY = "binary"
+
+RESOLVERS = [HTML, PROBE, BINARY]
+
+MISSING_STATUSES = [403, 404, 410]
+
+DEFAULT_BATCH_SIZE = 16
+
+
+class PageProber:
+    def __init__(self, fetcher: Fetcher, session: requests.Session, strategy: str = PROBE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_pages: int = 1000):
+        """Counts the pages of a chapter by requesting its image urls instead of its reader page.
+
+        Pages are assumed to be numbered from 1 without gaps. The "probe"
+        strategy sends batch_size HEAD requests at once, page 1 upwards, and
+        stops at the first missing page, usually within one round trip. The
+        "binary" strategy doubles a HEAD probe until a page is missing and
+        then bisects, about 2 * log2(pages) sequential requests but far fewer
+        in total.
+
+        Arguments:
+            fetcher {Fetcher} -- Fetch layer
+            session {requests.Session} -- Session to use
+
+        Keyword Arguments:
+            strategy {str} -- "probe" or "binary" (default: {"probe"})
+            batch_size {int} -- Concurrent requests of the "probe" strategy (default: {16})
+            max_pages {int} -- Pages counted at most (default: {1000})
+        """
+
+        if strategy not in [PROBE, BINARY]:
+            raise ValueError(f"Unknown probing strategy: {strategy}")
+
+        self.fetcher = fetcher
+        self.session = session
+        self.strategy = strategy
+        self.batch_size = max(batch_size, 1)
+        self.max_pages = max_pages
+        self.logger = logging.getLogger(__name__)
+
+    def exists(self, url: str) -> bool:
+        """Checks if a page exists.
+
+        A redirect or a success that is not an image counts as missing,
+        sites send the missing pages to an error page or their home page.
+
+        Raises:
+            FetchError: The site answered with anything other than success or a missing page
+
+        Returns:
+            bool -- True if the url serves an image
+        """
+
+        try:
+            res = self.fetcher.head(self.session, url, allow_redirects=False)
+        except FetchError as e:
+            if e.status in MISSING_STATUSES:
+                return False
+
+            raise
+
+        if not 200 <= res.status_code < 300:
+            return False
+
+        return res.headers.get("Content-Type", "image/").startswith("image/")
+
+    def count(self, url_format) -> int:
+        """Counts the consecutive pages that exist.
+
+        Arguments:
+            url_format {callable} -- Gives the url of a page number
+
+        Returns:
+            int -- Number of pages, 0 if the first one is missing
+        """
+
+        if self.strategy == BINARY:
+            return self._bisect(url_format)
+
+        return self._probe(url_format)
+
+    def _probe(self, url_format) -> int:
+        with ThreadPoolExecutor(max_workers=self.batch_size) as executor:
+            for start in range(1, self.max_pages + 1, self.batch_size):
+                numbers = range(start, min(start + self.batch_size,
+                                           self.max_pages + 1))
+
+                found = executor.map(
+                    lambda number: self.exists(url_format(number)), numbers)
+
+                for number, exists in zip(numbers, found):
+                    if not exists:
+                        return number - 1
+
+        return self.max_pages
+
+    def _bisect(self, url_format) -> int:
+        if not self.exists(url_format(1)):
+            return 0
+
+        # Pages up to low exist, high is missing.
+        low, high = 1, 2
+        while high <= self.max_pages and self.exists(url_format(high)):
+            low, high = high, high * 2
+
+        high = min(high, self.max_pages + 1)
+
+        while high - low > 1:
+            middle = (low + high) // 2
+
+            if self.exists(url_format(middle)):
+                low = middle
+            else:
+                high = middle
+
+        return low
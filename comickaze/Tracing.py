@@ -0,0 +1,214 @@
+from contextlib import contextmanager
+from collections import defaultdict
+import json
+import os
+import sys
+import threading
+import time
+
+FETCH = "fetch"
+PARSE = "parse"
+DISK = "disk"
+CONVERT = "convert"
+CHAPTER = "chapter"
+
+
+def _now() -> int:
+    return time.perf_counter_ns() // 1000
+
+
+class Span:
+    __slots__ = ("tracer", "name", "category", "tid", "args", "started_at")
+
+    def __init__(self, tracer, name: str, category: str, tid: int, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.tid = tid
+        self.args = args
+        self.started_at = None
+
+    def __enter__(self):
+        self.started_at = _now()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+
+        self.tracer._add({
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": self.started_at,
+            "dur": _now() - self.started_at,
+            "pid": self.tracer.pid,
+            "tid": self.tid if self.tid is not None else threading.get_ident(),
+            "args": self.args
+        })
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    enabled = True
+
+    def __init__(self):
+        """Records timed spans around fetches, parsing, disk writes and conversion, safe to share between threads.
+
+        Spans are exported as Chrome trace events, open the file in
+        chrome://tracing or https://ui.perfetto.dev. Pass a {NullTracer},
+        the default everywhere, to turn tracing off.
+        """
+
+        self.pid = os.getpid()
+        self.events = []
+        self._lock = threading.Lock()
+
+    def _add(self, event: dict):
+        with self._lock:
+            self.events.append(event)
+
+    def span(self, name: str, category: str, tid: int = None, **args) -> Span:
+        """Times the body of a with statement.
+
+        Arguments:
+            name {str} -- Name of the span
+            category {str} -- Category, "fetch", "parse", "disk", "convert" or "chapter"
+
+        Keyword Arguments:
+            tid {int} -- Track of the span, defaults to the current thread. Coroutines sharing a thread
+                         pass their own so their spans do not overlap (default: {None})
+            **args -- Shown with the span
+        """
+
+        return Span(self, name, category, tid, args)
+
+    def begin(self, name: str, category: str, key, **args):
+        """Starts a span that ends on any thread, see {Tracer.end}.
+
+        Arguments:
+            name {str} -- Name of the span
+            category {str} -- Category
+            key {object} -- Identifies the span, e.g. a chapter
+        """
+
+        self._add({"name": name, "cat": category, "ph": "b", "id": id(key),
+                   "ts": _now(), "pid": self.pid, "tid": threading.get_ident(), "args": args})
+
+    def end(self, name: str, category: str, key, **args):
+        self._add({"name": name, "cat": category, "ph": "e", "id": id(key),
+                   "ts": _now(), "pid": self.pid, "tid": threading.get_ident(), "args": args})
+
+    def summary(self) -> dict:
+        """Sums up the spans.
+
+        Returns:
+            dict -- {name: {"count", "seconds"}} of every span timed with {Tracer.span}, slowest first
+        """
+
+        totals = defaultdict(lambda: {"count": 0, "seconds": 0})
+
+        with self._lock:
+            for event in self.events:
+                if event["ph"] == "X":
+                    totals[event["name"]]["count"] += 1
+                    totals[event["name"]]["seconds"] += event["dur"] / 1e6
+
+        return dict(sorted(totals.items(), key=lambda item: -item[1]["seconds"]))
+
+    def export(self, trace_path: str):
+        """Writes the spans to a Chrome trace-event JSON file.
+
+        Arguments:
+            trace_path {str} -- Path of the JSON file
+        """
+
+        with self._lock:
+            events = list(self.events)
+
+        with open(trace_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+class NullTracer:
+    """{Tracer} that records nothing, its spans cost a method call."""
+
+    enabled = False
+
+    def span(self, name: str, category: str, tid: int = None, **args) -> NullSpan:
+        return NULL_SPAN
+
+    def begin(self, name: str, category: str, key, **args):
+        pass
+
+    def end(self, name: str, category: str, key, **args):
+        pass
+
+    def summary(self) -> dict:
+        return {}
+
+    def export(self, trace_path: str):
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+@contextmanager
+def profiled(profile_path: str):
+    """Runs the body of a with statement under cProfile and writes the stats to profile_path.
+
+    Threads started inside the body are profiled too, open the dump with
+    pstats or snakeviz.
+
+    Arguments:
+        profile_path {str} -- Path of the cProfile dump
+    """
+
+    import cProfile
+    import pstats
+
+    profiles = []
+    lock = threading.Lock()
+
+    def profile_thread(frame, event, arg):
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+
+        try:
+            profile.enable()
+        except ValueError:
+            # Newer interpreters profile every thread from the first profiler.
+            return
+
+        with lock:
+            profiles.append(profile)
+
+    main = cProfile.Profile()
+    threading.setprofile(profile_thread)
+    main.enable()
+
+    try:
+        yield
+    finally:
+        main.disable()
+        threading.setprofile(None)
+
+        stats = pstats.Stats(main)
+        with lock:
+            for profile in profiles:
+                stats.add(profile)
+
+        stats.dump_stats(profile_path)
@@ -0,0 +1,154 @@
+import os
+import time
+from os import path
+
+from .Manifest import PART_SUFFIX
+
+JPEG = "jpeg"
+WEBP = "webp"
+
+DEFAULT_QUALITY = {
+    JPEG: 85,
+    WEBP: 80
+}
+
+
+class Transform:
+    def __init__(self, max_size: int = None, quality: int = None, image_format: str = JPEG, grayscale: bool = False):
+        """Re-encoding applied to every page before it is packed, needs Pillow.
+
+        Pages are replaced by their re-encoded version, a JPEG page that
+        would grow without being resized or converted is left untouched.
+        Instances are sent to worker processes and must stay picklable.
+
+        Keyword Arguments:
+            max_size {int} -- Longest side in pixels, larger pages are scaled down, None to keep the size (default: {None})
+            quality {int} -- Encoder quality from 1 to 100, defaults to 85 for JPEG and 80 for WebP (default: {None})
+            image_format {str} -- Output format, "jpeg" or "webp". WebP pages only fit in CBZ archives (default: {"jpeg"})
+            grayscale {bool} -- Convert pages to grayscale (default: {False})
+        """
+
+        image_format = image_format.lower()
+        if image_format not in DEFAULT_QUALITY:
+            raise ValueError(f"Unknown image format: {image_format}")
+
+        self.max_size = max_size
+        self.quality = quality if quality is not None else DEFAULT_QUALITY[image_format]
+        self.image_format = image_format
+        self.grayscale = grayscale
+
+    @property
+    def extension(self) -> str:
+        return ".webp" if self.image_format == WEBP else ".jpg"
+
+    def apply(self, file_path: str) -> tuple:
+        """Re-encodes an image.
+
+        Arguments:
+            file_path {str} -- Path of the image
+
+        Returns:
+            tuple -- (output path, size before, size after, seconds spent)
+        """
+
+        try:
+            from PIL import Image
+        except ImportError:
+            raise ImportError(
+                "Transforming pages needs Pillow, install it with: pip install Comickaze[transform]")
+
+        started_at = time.perf_counter()
+        before = path.getsize(file_path)
+        output = path.splitext(file_path)[0] + self.extension
+        part_path = output + PART_SUFFIX
+
+        with Image.open(file_path) as image:
+            size = image.size
+            source_format = image.format
+
+            if self.grayscale:
+                image = image.convert("L")
+            elif image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+
+            if self.max_size is not None:
+                image.thumbnail((self.max_size, self.max_size),
+                                Image.LANCZOS)
+
+            unchanged = image.size == size and not self.grayscale and source_format == "JPEG" \
+                and self.image_format == JPEG
+
+            if self.image_format == WEBP:
+                image.save(part_path, format="WEBP", quality=self.quality)
+            else:
+                image.save(part_path, format="JPEG",
+                           quality=self.quality, optimize=True)
+
+        after = path.getsize(part_path)
+
+        # Re-encoding a JPEG at the same size can make it bigger.
+        if unchanged and after >= before:
+            os.remove(part_path)
+            return file_path, before, before, time.perf_counter() - started_at
+
+        # Replaced rather than written in place, the page may be hardlinked
+        # into the image store.
+        os.replace(part_path, output)
+        if output != file_path:
+            os.remove(file_path)
+
+        return output, before, after, time.perf_counter() - started_at
+
+
+def transform_image(transform: Transform, file_path: str) -> tuple:
+    return transform.apply(file_path)
+
+
+def transform_images(transform: Transform, images: list, executor=None) -> list:
+    """Applies a transform to images, on an executor if one is given.
+
+    Arguments:
+        transform {Transform} -- Transform
+        images {list} -- Paths of the images
+
+    Keyword Arguments:
+        executor {Executor} -- Executor to spread the images over, usually a process pool (default: {None})
+
+    Returns:
+        list -- Result of {Transform.apply} for every image
+    """
+
+    if executor is None:
+        return [transform.apply(image) for image in images]
+
+    return list(executor.map(transform_image, [transform] * len(images), images))
+
+
+def summarize(results: list, elapsed: float = None) -> dict:
+    """Sums up transform results.
+
+    Arguments:
+        results {list} -- Results of {Transform.apply}
+
+    Keyword Arguments:
+        elapsed {float} -- Wall-clock seconds the results took (default: {None})
+
+    Returns:
+        dict -- Pages, bytes before and after, saved share of the bytes, seconds of CPU time, pages per core second
+                and pages per second
+    """
+
+    pages = len(results)
+    before = sum(result[1] for result in results)
+    after = sum(result[2] for result in results)
+    seconds = sum(result[3] for result in results)
+
+    return {
+        "pages": pages,
+        "bytes_before": before,
+        "bytes_after": after,
+        "saved": 1 - after / before if before else 0,
+        "seconds": seconds,
+        "pages_per_core_second": pages / seconds if seconds else 0,
+        "pages_per_second": pages / elapsed if elapsed else None
+    }
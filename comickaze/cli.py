@@ -1,11 +1,23 @@
 import click
 from click import echo, types
+import json
+
 from colorama import Fore, Back, Style, init as colorama_init
 from PyInquirer import prompt
 
 from comickaze import Comickaze
 from comickaze.objects import Comic, Suggestion, Chapter
 from comickaze.Converter import CBZ, PDF, IMG
+from comickaze.Downloader import THREAD, ASYNC, SHARED
+from comickaze.Batch import parse_batch
+from comickaze.BlobStore import BlobStore
+from comickaze.Cache import Cache, COMIC
+from comickaze.Fetcher import Fetcher
+from comickaze.Transform import Transform, JPEG, WEBP
+from comickaze.Resolver import RESOLVERS, HTML
+from comickaze.Catalog import Catalog
+from comickaze.Tracing import Tracer, profiled
+from comickaze.Library import Library, DEFAULT_LIBRARY_PATH, DEFAULT_CACHE_DIR, DEFAULT_CATALOG_DIR
 
 
 @click.group()
@@ -14,6 +26,29 @@ def cli():
     colorama_init()
 
 
+def instrument(trace_path: str, profile_path: str) -> Tracer:
+    """Starts the tracer of --trace and the profiler of --profile, both are written once the command ends."""
+
+    ctx = click.get_current_context()
+
+    if profile_path:
+        ctx.with_resource(profiled(profile_path))
+
+    if not trace_path:
+        return None
+
+    tracer = Tracer()
+
+    def export():
+        tracer.export(trace_path)
+
+        for name, total in tracer.summary().items():
+            echo(f"{name}: {total['count']} span(s), {total['seconds']:.2f}s", err=True)
+
+    ctx.call_on_close(export)
+    return tracer
+
+
 @cli.command()
 @click.option("-q", "--query", type=types.STRING, prompt="Please input the title of your desired comics.")
 @click.option("-o", "--output-format", type=types.Choice([CBZ, PDF, IMG]), default=CBZ, help="The file format of the downloaded comics.")
@@ -21,11 +56,45 @@ def cli():
 @click.option("--delete-original", is_flag=True, default=True, help="Set to false if you want to keep the images before it was converted.")
 @click.option("-t", "--threads", type=types.INT, default=4, help="Number of threads to use while download a chapter.")
 @click.option("--daemon", type=types.BOOL, default=True, help="Sets the daemon value of the threads.")
+@click.option("-e", "--engine", type=types.Choice([THREAD, ASYNC]), default=THREAD, help="Download engine. The async engine needs aiohttp.")
+@click.option("--adaptive", is_flag=True, default=False, help="Thread engine only. Tunes the number of active threads between --min-threads and --threads from latency and error rates.")
+@click.option("--min-threads", type=types.INT, default=1, help="Lowest number of active threads with --adaptive.")
+@click.option("--stream", is_flag=True, default=False, help="CBZ only. Packs pages into one archive per chapter as they download, without staging images on disk.")
+@click.option("--in-memory", is_flag=True, default=False, help="CBZ only. Keeps the pages of a chapter in memory until they are packed instead of staging them on disk.")
+@click.option("--merge-pdf", is_flag=True, default=False, help="PDF only. Builds one PDF for the whole comic instead of one per chapter.")
+@click.option("--verify", is_flag=True, default=False, help="Checks that every page is a complete JPEG or PNG of the announced size before converting it.")
+@click.option("--max-staged-chapters", type=types.INT, default=4, help="Finished chapters waiting for verification or conversion at most, downloads pause while this many are waiting.")
+@click.option("--staging-limit", type=types.INT, default=None, help="Chapters downloading or waiting for conversion at most, the next one starts once one is converted. Bounds disk use with per-chapter PDFs only.")
+@click.option("--staging-quota", type=types.FLOAT, default=None, help="Estimated MiB of chapters downloading or waiting for conversion at most. Bounds disk use with per-chapter PDFs only.")
+@click.option("--no-space-check", is_flag=True, default=False, help="Starts even when the estimated download does not fit on the disk.")
+@click.option("--max-size", type=types.INT, default=None, help="Scales pages down so their longest side is at most this many pixels.")
+@click.option("--quality", type=types.IntRange(1, 100), default=None, help="Re-encodes pages at this quality, 85 for JPEG and 80 for WebP by default.")
+@click.option("--image-format", type=types.Choice([JPEG, WEBP]), default=None, help="Re-encodes pages in this format, WebP only works with CBZ.")
+@click.option("--grayscale", is_flag=True, default=False, help="Converts pages to grayscale.")
+@click.option("-r", "--retries", type=types.INT, default=3, help="Number of times a failed request is retried.")
+@click.option("--rate-limit", type=types.FLOAT, default=None, help="Maximum requests per second per host.")
+@click.option("--cache-dir", type=types.Path(exists=False, resolve_path=True, file_okay=False, dir_okay=True), default=None, help="Caches search results, comic and chapter pages in this directory.")
+@click.option("--store-dir", type=types.Path(exists=False, resolve_path=True, file_okay=False, dir_okay=True), default=None, help="Keeps every downloaded image once in this content-addressed store and links known images instead of downloading them again. Use the download directory's filesystem.")
+@click.option("--resolver", type=types.Choice(RESOLVERS), default=HTML, help="How chapter pages are found. probe and binary count the page images with HEAD requests instead of reading the chapter page.")
+@click.option("--report", "report_path", type=types.Path(dir_okay=False, resolve_path=True), default=None, help="Writes throughput, latency and chapter timings of the download to this JSON file.")
+@click.option("--trace", "trace_path", type=types.Path(dir_okay=False, resolve_path=True), default=None, help="Writes spans of every fetch, parse, disk write and conversion to this Chrome trace JSON file.")
+@click.option("--profile", "profile_path", type=types.Path(dir_okay=False, resolve_path=True), default=None, help="Writes a cProfile dump of the command to this file.")
 @click.option("-ll", "--log-level", type=types.Choice(["DEBUG", "VERBOSE", "ERROR"]), default="ERROR", help="Sets the logger's log level.")
-def download(query, output_format, download_dir, delete_original, threads, daemon, log_level):
+def download(query, output_format, download_dir, delete_original, threads, daemon, engine, adaptive, min_threads, stream, in_memory, merge_pdf, verify, max_staged_chapters, staging_limit, staging_quota, no_space_check, max_size, quality, image_format, grayscale, retries, rate_limit, cache_dir, store_dir, resolver, report_path, trace_path, profile_path, log_level):
     """Download Comics"""
 
-    ck = Comickaze(log_level=log_level)
+    tracer = instrument(trace_path, profile_path)
+    fetcher = Fetcher(retries=retries, rate_limit=rate_limit,
+                      burst=max(threads, 1), tracer=tracer)
+    cache = Cache(cache_dir) if cache_dir else None
+    store = BlobStore(store_dir) if store_dir else None
+    ck = Comickaze(log_level=log_level, fetcher=fetcher,
+                   cache=cache, store=store, resolver=resolver)
+
+    transform = None
+    if max_size is not None or quality is not None or image_format is not None or grayscale:
+        transform = Transform(max_size=max_size, quality=quality,
+                              image_format=image_format or JPEG, grayscale=grayscale)
 
     suggestions = ck.search_comics(query)
 
@@ -104,9 +173,163 @@ def download(query, output_format, download_dir, delete_original, threads, daemo
         chapters = answers["chapters"]
 
         downloader = ck.create_downloader(
-            chapters, number_of_threads=threads, output_format=output_format, daemon=daemon)
+            chapters, number_of_threads=threads, output_format=output_format, daemon=daemon, engine=engine, adaptive=adaptive, min_threads=min_threads, streaming=stream, in_memory=in_memory, merge_pdf=merge_pdf, verify=verify, max_staged_chapters=max_staged_chapters, staging_limit=staging_limit, staging_quota=int(staging_quota * 2 ** 20) if staging_quota is not None else None, check_space=not no_space_check, transform=transform, report_path=report_path)
         downloader.start(download_dir)
 
 
+@cli.command()
+@click.argument("link")
+@click.option("--only-new", is_flag=True, default=False, help="Only sync chapters released after now.")
+@click.option("-l", "--library", "library_path", type=types.Path(dir_okay=False, resolve_path=True), default=DEFAULT_LIBRARY_PATH, help="Library file.")
+@click.option("-ll", "--log-level", type=types.Choice(["DEBUG", "VERBOSE", "ERROR"]), default="ERROR", help="Sets the logger's log level.")
+def follow(link, only_new, library_path, log_level):
+    """Follow a comic, LINK is the comic's page"""
+
+    ck = Comickaze(log_level=log_level)
+    comic = ck.get_comic(link)
+
+    library = Library(library_path)
+    library.follow(comic, mark_downloaded=only_new)
+    library.save()
+
+    echo(f"Following {comic.title}, {len(library.new_chapters(comic))} chapter(s) to sync.")
+
+
+@cli.command()
+@click.argument("link")
+@click.option("-l", "--library", "library_path", type=types.Path(dir_okay=False, resolve_path=True), default=DEFAULT_LIBRARY_PATH, help="Library file.")
+def unfollow(link, library_path):
+    """Unfollow a comic, LINK is the comic's page"""
+
+    library = Library(library_path)
+
+    if library.unfollow(link):
+        library.save()
+        echo(f"Unfollowed {link}.")
+    else:
+        echo(f"{link} is not followed.")
+
+
+@cli.command()
+@click.option("-d", "--download-dir", type=types.Path(exists=False, resolve_path=True, file_okay=False, dir_okay=True), prompt="Where do you want to save the downloaded comics? (Path)", help="Download directory.")
+@click.option("-o", "--output-format", type=types.Choice([CBZ, PDF, IMG]), default=CBZ, help="The file format of the downloaded comics.")
+@click.option("-t", "--threads", type=types.INT, default=4, help="Number of threads to use while downloading.")
+@click.option("-l", "--library", "library_path", type=types.Path(dir_okay=False, resolve_path=True), default=DEFAULT_LIBRARY_PATH, help="Library file.")
+@click.option("--cache-dir", type=types.Path(exists=False, resolve_path=True, file_okay=False, dir_okay=True), default=DEFAULT_CACHE_DIR, help="Cache directory, comic pages are revalidated on every sync.")
+@click.option("--store-dir", type=types.Path(exists=False, resolve_path=True, file_okay=False, dir_okay=True), default=None, help="Keeps every downloaded image once in this content-addressed store and links known images instead of downloading them again. Use the download directory's filesystem.")
+@click.option("-ll", "--log-level", type=types.Choice(["DEBUG", "VERBOSE", "ERROR"]), default="ERROR", help="Sets the logger's log level.")
+def sync(download_dir, output_format, threads, library_path, cache_dir, store_dir, log_level):
+    """Download new chapters of the followed comics"""
+
+    library = Library(library_path)
+
+    # Comic pages expire at once so every sync asks for changes, chapter
+    # pages never change and stay cached.
+    cache = Cache(cache_dir, ttl={COMIC: 0})
+    store = BlobStore(store_dir) if store_dir else None
+    ck = Comickaze(log_level=log_level, cache=cache, store=store)
+
+    chapters = ck.sync(library, download_dir,
+                       number_of_threads=threads, output_format=output_format)
+
+    echo(f"Synced {len(chapters)} chapter(s) from {len(library.comics)} comic(s).")
+
+
+@cli.command()
+@click.option("-i", "--input", "input_file", type=types.File("r"), default="-", help="File of \"<link or slug> [range]\" lines, e.g. \"deadpool-2019 1-10,15\". Reads stdin by default.")
+@click.option("-d", "--download-dir", type=types.Path(exists=False, resolve_path=True, file_okay=False, dir_okay=True), required=True, help="Download directory.")
+@click.option("-o", "--output-format", type=types.Choice([CBZ, PDF, IMG]), default=CBZ, help="The file format of the downloaded comics.")
+@click.option("-t", "--threads", type=types.INT, default=8, help="Number of threads to use while downloading.")
+@click.option("-s", "--summary", "summary_file", type=types.File("w"), default=None, help="Writes the per-item result summary as JSON to this file.")
+@click.option("-r", "--retries", type=types.INT, default=3, help="Number of times a failed request is retried.")
+@click.option("--rate-limit", type=types.FLOAT, default=None, help="Maximum requests per second per host.")
+@click.option("--cache-dir", type=types.Path(exists=False, resolve_path=True, file_okay=False, dir_okay=True), default=None, help="Caches search results, comic and chapter pages in this directory.")
+@click.option("--store-dir", type=types.Path(exists=False, resolve_path=True, file_okay=False, dir_okay=True), default=None, help="Keeps every downloaded image once in this content-addressed store and links known images instead of downloading them again. Use the download directory's filesystem.")
+@click.option("--resolver", type=types.Choice(RESOLVERS), default=HTML, help="How chapter pages are found. probe and binary count the page images with HEAD requests instead of reading the chapter page.")
+@click.option("--report", "report_path", type=types.Path(dir_okay=False, resolve_path=True), default=None, help="Writes throughput, latency and chapter timings of the download to this JSON file.")
+@click.option("--trace", "trace_path", type=types.Path(dir_okay=False, resolve_path=True), default=None, help="Writes spans of every fetch, parse, disk write and conversion to this Chrome trace JSON file.")
+@click.option("--profile", "profile_path", type=types.Path(dir_okay=False, resolve_path=True), default=None, help="Writes a cProfile dump of the command to this file.")
+@click.option("-ll", "--log-level", type=types.Choice(["DEBUG", "VERBOSE", "ERROR"]), default="ERROR", help="Sets the logger's log level.")
+def batch(input_file, download_dir, output_format, threads, summary_file, retries, rate_limit, cache_dir, store_dir, resolver, report_path, trace_path, profile_path, log_level):
+    """Download many comics without prompts"""
+
+    items = parse_batch(input_file)
+
+    tracer = instrument(trace_path, profile_path)
+    fetcher = Fetcher(retries=retries, rate_limit=rate_limit,
+                      burst=max(threads, 1), tracer=tracer)
+    cache = Cache(cache_dir) if cache_dir else None
+    store = BlobStore(store_dir) if store_dir else None
+    ck = Comickaze(log_level=log_level, fetcher=fetcher,
+                   cache=cache, store=store, resolver=resolver, pool_size=max(threads, 10))
+
+    results = ck.batch_download(items, download_dir, number_of_threads=threads,
+                                output_format=output_format, session_policy=SHARED, report_path=report_path)
+
+    if summary_file is not None:
+        json.dump(results, summary_file, indent=2)
+
+    for result in results:
+        status = result["error"] or f"{result['completed']} of {result['requested']} chapter(s)"
+        echo(f"{result['item']}: {status}")
+
+    if any(result["error"] or result["failed"] for result in results):
+        raise SystemExit(1)
+
+
+@cli.group()
+def catalog():
+    """Search comics in a local catalog"""
+
+
+@catalog.command()
+@click.option("-i", "--input", "input_file", type=types.File("r"), default=None, help="File of comic links or slugs to add to the catalog, one per line.")
+@click.option("-t", "--threads", type=types.INT, default=4, help="Number of comics fetched at the same time.")
+@click.option("--catalog-dir", type=types.Path(exists=False, resolve_path=True, file_okay=False, dir_okay=True), default=DEFAULT_CATALOG_DIR, help="Catalog directory.")
+@click.option("-ll", "--log-level", type=types.Choice(["DEBUG", "VERBOSE", "ERROR"]), default="ERROR", help="Sets the logger's log level.")
+def refresh(input_file, threads, catalog_dir, log_level):
+    """Fetch every comic of the catalog again"""
+
+    links = [item.comic for item in parse_batch(input_file)] if input_file else []
+
+    ck = Comickaze(log_level=log_level, catalog=Catalog(catalog_dir),
+                   pool_size=max(threads, 10))
+    failed = ck.refresh_catalog(links, number_of_threads=threads)
+
+    for link in failed:
+        echo(f"Failed to refresh {link}.")
+
+    echo(f"The catalog holds {len(ck.catalog)} comic(s).")
+
+    if len(failed) > 0:
+        raise SystemExit(1)
+
+
+@catalog.command()
+@click.argument("queries", nargs=-1, required=True)
+@click.option("-n", "--limit", type=types.INT, default=10, help="Maximum number of results per query.")
+@click.option("-t", "--threads", type=types.INT, default=4, help="Number of remote searches at the same time.")
+@click.option("--catalog-dir", type=types.Path(exists=False, resolve_path=True, file_okay=False, dir_okay=True), default=DEFAULT_CATALOG_DIR, help="Catalog directory.")
+@click.option("--fuzzy", is_flag=True, default=False, help="Also answers from the catalog with similar names, e.g. for typos.")
+@click.option("--json", "as_json", is_flag=True, default=False, help="Prints the results as JSON.")
+@click.option("-ll", "--log-level", type=types.Choice(["DEBUG", "VERBOSE", "ERROR"]), default="ERROR", help="Sets the logger's log level.")
+def search(queries, limit, threads, catalog_dir, fuzzy, as_json, log_level):
+    """Search comics, the site is only asked when the catalog has no match"""
+
+    ck = Comickaze(log_level=log_level, catalog=Catalog(catalog_dir))
+    results = ck.search_many(queries, limit=limit, number_of_threads=threads, fuzzy=fuzzy)
+
+    if as_json:
+        echo(json.dumps({query: [{"title": s.title, "slug": s.slug, "link": s.link} for s in suggestions]
+                         for query, suggestions in results.items()}, indent=2))
+        return
+
+    for query, suggestions in results.items():
+        echo(f"{query}:")
+
+        for suggestion in suggestions:
+            echo(f"  {suggestion.title} ({suggestion.slug})")
+
+
 if __name__ == "__main__":
     cli()
@@ -1,2 +1,16 @@
 class NoChapterError(Exception):
     pass
+
+
+class FetchError(Exception):
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+
+class VerificationError(Exception):
+    pass
+
+
+class DiskSpaceError(Exception):
+    pass
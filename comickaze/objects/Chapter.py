@@ -1,7 +1,14 @@
+import threading
+
 from .Comic import Comic
 
+# Only guards the creation of the per-chapter locks.
+_LOCK = threading.Lock()
+
 
 class Chapter:
+    __slots__ = ("comickaze", "title", "link", "comic", "date", "_pages", "_lock")
+
     def __init__(self, comickaze, title: str, link: str, comic: Comic, date=None):
         """Chapter of a {Comic}
 
@@ -20,10 +27,46 @@ class Chapter:
         self.link = link
         self.comic = comic
         self.date = date
-        self.pages = []
+        self._pages = None
+        self._lock = None
+
+    @property
+    def pages(self):
+        """Page urls, empty until {Chapter.get_pages} resolved them."""
+
+        return self._pages if self._pages is not None else []
+
+    @pages.setter
+    def pages(self, pages):
+        self._pages = pages
+
+    @property
+    def resolved(self) -> bool:
+        return self._pages is not None
 
     def get_pages(self):
-        return self.comickaze.get_chapter_pages(self)
+        """Resolves the page urls on the first call and returns the same list afterwards.
+
+        Safe to call from several threads, only one of them fetches the chapter.
+
+        Returns:
+            PageList -- Page urls
+        """
+
+        if self._pages is None:
+            with self._get_lock():
+                if self._pages is None:
+                    self.comickaze.get_chapter_pages(self)
+
+        return self.pages
+
+    def _get_lock(self):
+        if self._lock is None:
+            with _LOCK:
+                if self._lock is None:
+                    self._lock = threading.Lock()
+
+        return self._lock
 
     def __str__(self):
         return self.title
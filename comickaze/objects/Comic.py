@@ -1,4 +1,7 @@
 class Comic:
+    __slots__ = ("title", "link", "slug", "summary", "chapters", "image", "comic_type", "status", "other_names",
+                 "authors", "year", "categories", "tags", "views", "rating")
+
     def __init__(self, title, link, image=None, comic_type=None, status=None, other_names=None,
                  authors=None, year=None, categories=None, tags=None, views=None, rating=None,
                  summary=None, chapters=None):
@@ -0,0 +1,57 @@
+from array import array
+from collections.abc import Sequence
+
+
+class PageList(Sequence):
+    __slots__ = ("prefix", "suffix", "numbers")
+
+    def __init__(self, prefix: str, numbers, suffix: str = ".jpg"):
+        """Read-only list of page urls stored as a url template and page numbers.
+
+        The urls of a chapter only differ by their page number, so instead of
+        N strings it keeps the shared prefix and suffix, and the numbers as a
+        range when they are consecutive, which they nearly always are, or as
+        an array otherwise. Urls are built on access.
+
+        Arguments:
+            prefix {str} -- Part of the urls before the page number
+            numbers {list} -- Page numbers in reading order
+
+        Keyword Arguments:
+            suffix {str} -- Part of the urls after the page number (default: {".jpg"})
+        """
+
+        self.prefix = prefix
+        self.suffix = suffix
+
+        numbers = list(numbers)
+
+        if len(numbers) > 0 and numbers == list(range(numbers[0], numbers[0] + len(numbers))):
+            self.numbers = range(numbers[0], numbers[0] + len(numbers))
+        else:
+            self.numbers = array("I", numbers)
+
+    def url(self, number: int) -> str:
+        return f"{self.prefix}{number:02d}{self.suffix}"
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.url(number) for number in self.numbers[index]]
+
+        return self.url(self.numbers[index])
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __iter__(self):
+        for number in self.numbers:
+            yield self.url(number)
+
+    def __eq__(self, other):
+        if isinstance(other, PageList):
+            return (self.prefix, self.suffix, list(self.numbers)) == (other.prefix, other.suffix, list(other.numbers))
+
+        return list(self) == other
+
+    def __repr__(self):
+        return f"PageList({self.prefix!r}, {self.numbers!r}, suffix={self.suffix!r})"
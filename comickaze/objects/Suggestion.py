@@ -1,4 +1,6 @@
 class Suggestion:
+    __slots__ = ("comickaze", "title", "slug", "link")
+
     def __init__(self, comickaze, title, slug):
         """Suggestion object from {Comickaze.search_comics()}
 
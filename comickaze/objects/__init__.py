@@ -1,3 +1,4 @@
 from .Suggestion import Suggestion
 from .Comic import Comic
 from .Chapter import Chapter
+from .PageList import PageList
@@ -1,19 +1,121 @@
+import errno
+import logging
+import os
 import unicodedata
 import string
+import re
+from importlib.util import find_spec
 from os import path
 import shutil
 import pathlib
 
+import coloredlogs
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 
+DEFAULT_POOL_SIZE = 10
 
-def create_session():
-    return requests.session()
+# Level coloredlogs was installed with on the package's logger.
+_installed_levels = {}
 
+HTML_PARSER = "html.parser"
+LXML = "lxml"
 
-def soupify(markup) -> BeautifulSoup:
-    return BeautifulSoup(markup, "html.parser")
+DEFAULT_PARSER = LXML if find_spec(LXML) is not None else HTML_PARSER
+
+PAGE_LIST_RE = re.compile(
+    r"<select[^>]*(?<![\w-])id\s*=\s*[\"']?page-list(?=[\"'\s>])[^>]*>(.*?)</select>", re.S | re.I)
+OPTION_RE = re.compile(r"<option\b([^>]*)>", re.I)
+OPTION_VALUE_RE = re.compile(
+    r"(?<![\w-])value\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))", re.I)
+
+
+def install_logging(level: str):
+    """Installs coloredlogs on the package's logger, only once per level so creating many instances stays cheap.
+
+    Every module logs to a child of it, so the level applies to all of them
+    and the last level installed wins.
+
+    Arguments:
+        level {str} -- Log level
+    """
+
+    logger = logging.getLogger(__package__)
+
+    if _installed_levels.get(logger.name) == level:
+        return
+
+    coloredlogs.install(level=level, logger=logger)
+    _installed_levels[logger.name] = level
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE, pool_block: bool = False) -> requests.Session:
+    """Creates a keep-alive session whose connection pools hold pool_size connections per host.
+
+    Keyword Arguments:
+        pool_size {int} -- Connections kept alive per host, should be at least the number of threads using the session (default: {10})
+        pool_block {bool} -- Block instead of opening throwaway connections when the pool is exhausted (default: {False})
+    """
+
+    session = requests.session()
+    session.headers["Connection"] = "keep-alive"
+
+    adapter = HTTPAdapter(pool_connections=pool_size,
+                          pool_maxsize=pool_size, pool_block=pool_block)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
+
+
+def soupify(markup, parser: str = None, parse_only=None) -> BeautifulSoup:
+    """Parses markup with the given BeautifulSoup tree builder.
+
+    Arguments:
+        markup {str} -- HTML
+
+    Keyword Arguments:
+        parser {str} -- "lxml" or "html.parser", defaults to lxml when it is installed (default: {None})
+        parse_only {SoupStrainer} -- Only build the subtrees matching this strainer (default: {None})
+    """
+
+    return BeautifulSoup(markup, parser or DEFAULT_PARSER, parse_only=parse_only)
+
+
+def find_page_list(markup: str) -> list:
+    """Extracts the option values of select#page-list without building a tree.
+
+    Arguments:
+        markup {str} -- HTML of a chapter's reader page
+
+    Raises:
+        ValueError: An option has no value or a value that is not a number
+
+    Returns:
+        list[int] -- Page numbers, None if the select could not be found
+    """
+
+    for match in PAGE_LIST_RE.finditer(markup):
+        # Tree builders skip the selects inside scripts and comments.
+        start = match.start()
+        if markup.rfind("<script", 0, start) > markup.rfind("</script", 0, start) or \
+                markup.rfind("<!--", 0, start) > markup.rfind("-->", 0, start):
+            continue
+
+        values = []
+
+        for attributes in OPTION_RE.findall(match.group(1)):
+            value = OPTION_VALUE_RE.search(attributes)
+
+            if value is None:
+                raise ValueError(f"Page list option without a value: <option{attributes}>")
+
+            values.append(int(next(group for group in value.groups() if group is not None)))
+
+        return values
+
+    return None
 
 
 def create_folders(directory):
@@ -28,6 +130,26 @@ def delete_folders(directory):
         shutil.rmtree(directory, ignore_errors=True)
 
 
+def preallocate(f, size: int):
+    """Reserves size bytes for a file being written, so a full disk fails before the download instead of midway.
+
+    Filesystems without preallocation support are skipped silently.
+
+    Arguments:
+        f {file} -- File opened for writing
+        size {int} -- Expected size in bytes
+    """
+
+    if size is None or size <= 0 or not hasattr(os, "posix_fallocate"):
+        return
+
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise
+
+
 def clean_filename(filename):
     # https://gist.github.com/wassname/1393c4a57cfcbf03641dbc31886123b8
     whitelist = "-_.() %s%s" % (string.ascii_letters, string.digits) + "',#"
@@ -23,6 +23,11 @@ setuptools.setup(
         "Click",
         "pyinquirer"
     ],
+    extras_require={
+        "async": ["aiohttp"],
+        "fast": ["lxml"],
+        "transform": ["Pillow"]
+    },
     license="MIT",
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,115 @@
+"""Parses saved comic and chapter pages with every tree builder and compares
+them with what the original html.parser code extracted from the same pages,
+stored in fixtures/expected.json.
+"""
+
+from importlib.util import find_spec
+from os import path
+from unittest import mock
+import json
+import unittest
+
+from comickaze import Comickaze
+from comickaze.util import find_page_list, HTML_PARSER, LXML
+
+FIXTURES = path.join(path.dirname(__file__), "fixtures")
+COMIC_LINK = "https://readcomicsonline.ru/comic/batman-the-long-halloween-1996"
+COMIC_FIELDS = ["title", "link", "image", "comic_type", "status", "other_names", "authors", "year",
+                "categories", "tags", "views", "rating", "summary"]
+
+PARSERS = [HTML_PARSER] + ([LXML] if find_spec(LXML) is not None else [])
+
+
+def read_fixture(name: str) -> str:
+    with open(path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def fake_get_text(url: str, kind: str, **kwargs) -> str:
+    return read_fixture("chapter.html" if url.endswith("/1") else "comic.html")
+
+
+class ParsingTest(unittest.TestCase):
+    def setUp(self):
+        with open(path.join(FIXTURES, "expected.json"), "r", encoding="utf-8") as f:
+            self.expected = json.load(f)
+
+    def get_comic(self, parser: str):
+        ck = Comickaze(parser=parser)
+
+        with mock.patch.object(ck, "_get_text", side_effect=fake_get_text):
+            return ck, ck.get_comic(COMIC_LINK)
+
+    def test_comic(self):
+        for parser in PARSERS:
+            with self.subTest(parser=parser):
+                _, comic = self.get_comic(parser)
+
+                self.assertEqual({field: getattr(comic, field) for field in COMIC_FIELDS},
+                                 self.expected["comic"])
+                self.assertEqual([{"title": c.title, "link": c.link, "date": c.date} for c in comic.chapters],
+                                 self.expected["chapters"])
+
+    def test_chapter_pages(self):
+        for parser in PARSERS:
+            with self.subTest(parser=parser):
+                ck, comic = self.get_comic(parser)
+
+                with mock.patch.object(ck, "_get_text", side_effect=fake_get_text):
+                    pages = ck.get_chapter_pages(comic.chapters[-1])
+
+                self.assertEqual(list(pages), self.expected["pages"])
+
+    def test_chapter_pages_without_page_list_regex(self):
+        for parser in PARSERS:
+            with self.subTest(parser=parser):
+                ck, comic = self.get_comic(parser)
+
+                with mock.patch("comickaze.Comickaze.find_page_list", return_value=None):
+                    pages = ck.parse_chapter_pages(comic.chapters[-1], read_fixture("chapter.html"))
+
+                self.assertEqual(list(pages), self.expected["pages"])
+
+    def test_non_numeric_page_fails(self):
+        markup = read_fixture("chapter.html").replace('value="7"', 'value="seven"')
+
+        for parser in PARSERS:
+            with self.subTest(parser=parser):
+                ck, comic = self.get_comic(parser)
+
+                with self.assertRaises(ValueError):
+                    ck.parse_chapter_pages(comic.chapters[-1], markup)
+
+
+class FindPageListTest(unittest.TestCase):
+    def test_quoting(self):
+        markup = ("<select class=x id=page-list><option value=\"1\">1</option><option value='2'>2</option>"
+                  "<option data-value=\"9\" value=3 selected>3</option></select>")
+
+        self.assertEqual(find_page_list(markup), [1, 2, 3])
+
+    def test_missing_select(self):
+        self.assertIsNone(find_page_list("<select id=\"chapter-list\"><option value=\"1\"></select>"))
+
+    def test_select_in_script_or_comment(self):
+        for markup in ["<script>var t = '<select id=\"page-list\"><option value=\"9\"></select>';</script>",
+                       "<!-- <select id=\"page-list\"><option value=\"9\"></select> -->"]:
+            with self.subTest(markup=markup):
+                self.assertIsNone(find_page_list(markup))
+                self.assertEqual(find_page_list(
+                    markup + "<select id=\"page-list\"><option value=\"1\"></select>"), [1])
+
+    def test_chapter_fixture(self):
+        self.assertEqual(find_page_list(read_fixture("chapter.html")), list(range(1, 13)))
+
+    def test_option_without_value(self):
+        with self.assertRaises(ValueError):
+            find_page_list("<select id=\"page-list\"><option value=\"1\">1</option><option>2</option></select>")
+
+    def test_non_numeric_value(self):
+        with self.assertRaises(ValueError):
+            find_page_list("<select id=\"page-list\"><option value=\"1\">1</option><option value=\"2a\">2</option></select>")
+
+
+if __name__ == "__main__":
+    unittest.main()